@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the TodoAgent tools at different list sizes
+
+Times add_todo, delete_todo, list_todos and _extract_action_and_item on an
+agent that already holds N todos. No network access is needed.
+
+Usage: python benchmarks/bench_agent_ops.py [sizes...]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from todo_agent import TodoAgent
+
+WORDS = ["milk", "eggs", "bread", "dentist", "mom", "report", "tickets", "cake", "invoice", "passport"]
+VERBS = ["buy", "call", "schedule", "book", "order", "clean", "plan", "send"]
+PHRASES = [
+    "I need to buy milk",
+    "I should call the dentist tomorrow",
+    "add schedule a team meeting",
+    "pick up the dry cleaning",
+    "I must remember the passport renewal",
+    "purchase a gift for the party",
+]
+
+
+def per_call(fn, args, repeat: int = 1) -> float:
+    """Mean seconds per call"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for a in args:
+            fn(*a)
+    return (time.perf_counter() - start) / (len(args) * repeat)
+
+
+def filled_agent(n: int) -> TodoAgent:
+    rng = random.Random(n)
+    agent = TodoAgent()
+    agent.add_todos([f"{rng.choice(VERBS)} {rng.choice(WORDS)} {i}" for i in range(n)])
+    return agent
+
+
+def run(n: int):
+    agent = filled_agent(n)
+    calls = 200
+
+    # New items, then delete the same items so the size stays at n
+    add = per_call(agent.add_todo, [(f"buy benchmark item {i}",) for i in range(calls)])
+    delete = per_call(agent.delete_todo, [(f"benchmark item {i}",) for i in range(calls)])
+    list_repeat = max(1, 20000 // max(n, 1))
+    list_all = per_call(agent.list_todos, [()], repeat=list_repeat)
+    extract = per_call(agent._extract_action_and_item, [(phrase,) for phrase in PHRASES], repeat=500)
+
+    print(f"{n:>8} todos | add_todo {add * 1e6:9.1f}us | delete_todo {delete * 1e6:9.1f}us | "
+          f"list_todos {list_all * 1e3:9.3f}ms | _extract_action_and_item {extract * 1e6:6.2f}us")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100, 10000, 100000]
+    for size in sizes:
+        run(size)
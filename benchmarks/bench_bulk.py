@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Bulk import/export, paging and the cached list text
+
+1. Import: n todos sent as one "add ..." chat message each (the fast path,
+   so no model calls) vs import_ndjson in batches, in memory and on SQLite.
+2. Export: the whole list built as one JSON payload from get_all_todos vs
+   the streamed NDJSON export, with the peak memory allocated while doing it.
+3. Paging: time per page of 100 through the whole list.
+4. list_todos: rendering the full list text vs returning the cached one.
+
+Usage: python benchmarks/bench_bulk.py 10000 100000
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from bulk import export_ndjson, import_ndjson
+from sessions import InMemorySessionStore, SessionManager
+from storage import SqliteDatabase
+
+
+def make_body(n: int) -> bytes:
+    # Every tenth line repeats an earlier one, imports from other tools often have duplicates
+    return "".join(json.dumps({"text": f"I need to buy item {i - i % 10 if i % 10 == 9 else i}"}) + "\n"
+                   for i in range(n)).encode("utf-8")
+
+
+async def chunks(body: bytes, size: int = 64 * 1024):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+def make_sessions(sqlite: bool) -> SessionManager:
+    database = SqliteDatabase(os.path.join(tempfile.mkdtemp(), "bench.db")) if sqlite else None
+    return SessionManager(store=InMemorySessionStore(), database=database)
+
+
+async def bench_import(n: int, sqlite: bool) -> SessionManager:
+    body = make_body(n)
+    texts = [json.loads(line)["text"] for line in body.splitlines()]
+
+    one_by_one = make_sessions(sqlite)
+    start = time.perf_counter()
+    for text in texts:
+        async with one_by_one.session("u") as agent:
+            await agent.process_message_async(f"add {text}")
+    single = time.perf_counter() - start
+
+    sessions = make_sessions(sqlite)
+    start = time.perf_counter()
+    result = await import_ndjson(sessions, "u", chunks(body))
+    bulk = time.perf_counter() - start
+    label = "sqlite" if sqlite else "memory"
+    print(f"  import {label}: chat x{n} {single * 1000:8.0f}ms -> NDJSON {bulk * 1000:6.0f}ms "
+          f"({single / bulk:4.1f}x), added {result['added']} skipped {result['skipped']}")
+    return sessions
+
+
+async def whole_payload(sessions: SessionManager) -> int:
+    async with sessions.session("u") as agent:
+        return len(json.dumps([item.model_dump(mode="json") for item in agent.get_all_todos()]))
+
+
+async def streamed(sessions: SessionManager) -> int:
+    size = 0
+    async for chunk in export_ndjson(sessions, "u"):
+        size += len(chunk)
+    return size
+
+
+async def measure(export, sessions: SessionManager):
+    """Seconds taken, then peak bytes allocated in a second run, tracemalloc slows the first down"""
+    start = time.perf_counter()
+    size = await export(sessions)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    await export(sessions)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, size
+
+
+async def bench_export(sessions: SessionManager):
+    whole, whole_peak, _ = await measure(whole_payload, sessions)
+    stream, stream_peak, size = await measure(streamed, sessions)
+    print(f"  export: whole payload {whole * 1000:6.0f}ms peak {whole_peak / 1e6:6.1f}MB -> "
+          f"streamed {stream * 1000:6.0f}ms peak {stream_peak / 1e6:5.1f}MB ({size / 1e6:.1f}MB sent)")
+
+
+async def bench_paging(sessions: SessionManager):
+    pages = 0
+    cursor = None
+    start = time.perf_counter()
+    while True:
+        async with sessions.session("u") as agent:
+            _, cursor = agent.get_todos_page(cursor, 100)
+        pages += 1
+        if cursor is None:
+            break
+    elapsed = time.perf_counter() - start
+    print(f"  paging: {pages} pages of 100, {elapsed / pages * 1e6:6.0f}us per page")
+
+
+async def bench_list(sessions: SessionManager, repeat: int = 20):
+    async with sessions.session("u") as agent:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            agent._rendered_list = None
+            agent.list_todos()
+        rendered = (time.perf_counter() - start) / repeat
+        start = time.perf_counter()
+        for _ in range(repeat):
+            agent.list_todos()
+        cached = (time.perf_counter() - start) / repeat
+    print(f"  list_todos: render {rendered * 1000:7.2f}ms -> cached {cached * 1000:6.3f}ms")
+
+
+async def main(sizes):
+    for n in sizes:
+        print(f"{n} todos")
+        for sqlite in (False, True):
+            sessions = await bench_import(n, sqlite)
+            if not sqlite:
+                await bench_export(sessions)
+                await bench_paging(sessions)
+                await bench_list(sessions)
+
+
+if __name__ == "__main__":
+    asyncio.run(main([int(arg) for arg in sys.argv[1:]] or [10000, 100000]))
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Cold start: import time of main and time to the first responses
+
+Each run is a fresh interpreter that imports main, then sends a message the
+fast path answers ("add buy milk") and one that needs the model (a
+question, answered by the local OpenAI stub) through the scheduler, like
+the /chat handler does. Runs once with the OpenAI clients built by the
+first model call ("lazy") and once with them built by the startup warm-up
+("prewarm"). Reports medians over the runs, and whether openai had been
+imported before the first model call.
+
+Usage: python benchmarks/bench_cold_start.py --runs 10 [--importtime]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from stub_openai import StubOpenAIServer
+
+CHILD = """
+import time
+started = time.perf_counter()
+import asyncio, json, sys
+import main
+imported = time.perf_counter()
+openai_after_import = "openai" in sys.modules
+
+# What the server's startup hook does with TODO_PREWARM=1
+warm_up = main.session_manager.transport.warm_up() if sys.argv[1] == "prewarm" else None
+
+async def first_messages():
+    start = time.perf_counter()
+    await main.scheduler.submit("cold", "add buy milk")
+    fast = time.perf_counter() - start
+    openai_after_fast = "openai" in sys.modules
+    if warm_up is not None:
+        # The first model message arrives after the warm-up finished
+        warm_up.join()
+    start = time.perf_counter()
+    await main.scheduler.submit("cold", "what should I do first?")
+    return fast, openai_after_fast, time.perf_counter() - start
+
+fast, openai_after_fast, model = asyncio.run(first_messages())
+print(json.dumps({
+    "import": imported - started,
+    "fast": fast,
+    "model": model,
+    "openai_after_import": openai_after_import,
+    "openai_after_fast": openai_after_fast,
+}))
+"""
+
+
+def child_env(stub: StubOpenAIServer) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": stub.base_url,
+        # Every run should reach the stub, not a cached decision
+        "TODO_DECISION_CACHE": "0",
+        "PYTHONDONTWRITEBYTECODE": "1",
+    })
+    return env
+
+
+def run_once(env: dict, mode: str) -> dict:
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", CHILD, mode], cwd=ROOT, env=env, capture_output=True, text=True,
+                            check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process"] = time.perf_counter() - start
+    return result
+
+
+# Heavy packages worth tracking, each is only imported once per process
+PACKAGES = ("bubbletea_chat", "fastapi", "pydantic", "openai", "httpx", "numpy", "dotenv")
+
+
+def import_profile(env: dict):
+    """Cumulative import time of the heavy packages while importing main, from -X importtime"""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stderr
+    cumulative = {}
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and line.count("|") == 2:
+            _, micros, name = line.split("|")
+            if name.strip() in PACKAGES:
+                cumulative[name.strip()] = int(micros)
+    print("\nimported by main (cumulative ms, nested imports counted under their importer too):")
+    for name in PACKAGES:
+        print(f"  {name:16}" + (f"{cumulative[name] / 1000:8.1f}" if name in cumulative else "       -"))
+
+
+def main(args):
+    with StubOpenAIServer(latency=0.0, seed=0) as stub:
+        env = child_env(stub)
+        # Warm the OS file cache, the first interpreter start is always slower
+        run_once(env, "lazy")
+        results = {mode: [run_once(env, mode) for _ in range(args.runs)] for mode in ("lazy", "prewarm")}
+        if args.importtime:
+            import_profile(env)
+
+    def median_ms(mode: str, key: str) -> float:
+        return statistics.median(result[key] for result in results[mode]) * 1000
+
+    print(f"\ncold start, median of {args.runs} runs        lazy   prewarm")
+    for key, label in (("import", "import main"), ("fast", "first fast-path reply"),
+                       ("model", "first model reply"), ("process", "whole process")):
+        print(f"  {label:22} {median_ms('lazy', key):8.1f} {median_ms('prewarm', key):8.1f} ms")
+    print("  (the stub answers instantly, prewarm sends the model message once the warm-up is done)")
+    first = results["lazy"][0]
+    print(f"  openai imported by main: {first['openai_after_import']}, "
+          f"after the fast-path reply: {first['openai_after_fast']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import time and time to first response")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--importtime", action="store_true", help="also list the slowest imports")
+    main(parser.parse_args())
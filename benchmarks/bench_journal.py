@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Write overhead and cold recovery of the todo journal
+
+Journals N todo adds spread over many sessions and reports the cost per
+write, compared with re-serializing a whole list on every change. Then
+measures durable writes from concurrent threads (group commit) and how long
+a fresh JournalSessionStore takes to recover everything.
+
+Usage: python benchmarks/bench_journal.py [todos] [sessions]
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from journal import JournalSessionStore
+from models import TodoRecord
+
+
+def make_todos(count: int):
+    return [TodoRecord.new(f"Buy item number {i}") for i in range(count)]
+
+
+def bench_writes(directory: str, todos, sessions: int) -> float:
+    """Seconds per journaled add, buffered (the default)"""
+    store = JournalSessionStore(directory)
+    journals = [store.journal_for(f"user-{i}") for i in range(sessions)]
+    start = time.perf_counter()
+    for index, todo in enumerate(todos):
+        journals[index % sessions].added(todo)
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed / len(todos)
+
+
+def bench_naive(size: int, repeats: int = 5) -> float:
+    """Seconds to re-serialize a list of `size` todos, what a whole-state save costs per write"""
+    todos = [{"id": str(uuid.uuid4()), "text": f"Buy item number {i}", "created_at": "2024-01-01T00:00:00",
+              "completed": False} for i in range(size)]
+    start = time.perf_counter()
+    for _ in range(repeats):
+        json.dumps(todos)
+    return (time.perf_counter() - start) / repeats
+
+
+def bench_durable(directory: str, threads: int, per_thread: int):
+    """Latency of writes that wait for their fsync, with concurrent writers sharing commits"""
+    store = JournalSessionStore(directory, durable_writes=True)
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(index: int):
+        journal = store.journal_for(f"durable-{index}")
+        local = []
+        for todo in make_todos(per_thread):
+            start = time.perf_counter()
+            journal.added(todo)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    store.close()
+    latencies.sort()
+    return len(latencies) / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    sessions = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    directory = tempfile.mkdtemp(prefix="todo-journal-")
+    try:
+        todos = make_todos(count)
+        per_write = bench_writes(directory, todos, sessions)
+        print(f"journaled add        {per_write * 1e6:8.2f} us/write ({count:,} todos, {sessions:,} sessions)")
+        for size in sorted({count // sessions, 1_000, 10_000}):
+            print(f"naive resave of {size:>6,} {bench_naive(size) * 1e6:8.0f} us/write")
+
+        rate, p50, p99 = bench_durable(os.path.join(directory, "durable"), threads=16, per_thread=200)
+        print(f"durable add, 16 threads {rate:8,.0f} writes/s, p50 {p50 * 1e3:.2f} ms, p99 {p99 * 1e3:.2f} ms")
+
+        start = time.perf_counter()
+        store = JournalSessionStore(directory)
+        recovery = time.perf_counter() - start
+        print(f"cold recovery        {recovery:8.2f} s for {store.todo_count():,} todos "
+              f"({store.recovered['snapshot_todos']:,} from snapshot, {store.recovered['replayed']:,} replayed)")
+        store.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
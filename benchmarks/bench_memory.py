@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Bytes per resident todo, pydantic TodoItem vs slotted TodoRecord
+
+Fills many sessions with todos drawn from a small vocabulary, the way real
+lists repeat "buy milk", and measures allocated memory with tracemalloc:
+once as the old dict of TodoItem models (str uuid, datetime), once as
+TodoRecords (int uuid, epoch seconds, interned text), and once as whole
+InMemoryTodoStorage objects including their TodoIndex.
+
+Usage: python benchmarks/bench_memory.py [sessions] [todos per session]
+"""
+
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import TodoItem, TodoRecord
+from storage import InMemoryTodoStorage
+
+WORDS = ["milk", "eggs", "bread", "dentist", "mom", "report", "tickets", "cake", "invoice", "passport"]
+VERBS = ["Buy", "Call", "Schedule", "Book", "Order", "Clean", "Plan", "Send"]
+
+
+def session_texts(sessions: int, per_session: int):
+    rng = random.Random(0)
+    # "".join builds a new string object each time, like text parsed from a request
+    return [
+        ["".join([rng.choice(VERBS), " ", rng.choice(WORDS)]) for _ in range(per_session)]
+        for _ in range(sessions)
+    ]
+
+
+def measure(build, texts) -> float:
+    """Bytes allocated per todo by build(texts) that are still alive afterwards"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build(texts)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    count = sum(len(session) for session in texts)
+    del result
+    return (after - before) / count
+
+
+def build_items(texts):
+    now = datetime.now()
+    sessions = []
+    for session in texts:
+        todos = {}
+        for text in session:
+            todo_id = str(uuid.uuid4())
+            todos[todo_id] = TodoItem(id=todo_id, text=text, created_at=now, completed=False)
+        sessions.append(todos)
+    return sessions
+
+
+def build_records(texts):
+    sessions = []
+    for session in texts:
+        todos = {}
+        for text in session:
+            todo = TodoRecord.new(text)
+            todos[todo.id] = todo
+        sessions.append(todos)
+    return sessions
+
+
+def build_storages(texts):
+    storages = []
+    for session in texts:
+        storage = InMemoryTodoStorage()
+        for text in session:
+            storage.add(TodoRecord.new(text))
+        storages.append(storage)
+    return storages
+
+
+if __name__ == "__main__":
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    per_session = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    texts = session_texts(sessions, per_session)
+    print(f"{sessions:,} sessions x {per_session} todos, {len(WORDS) * len(VERBS)} distinct texts")
+
+    items = measure(build_items, texts)
+    records = measure(build_records, texts)
+    print(f"TodoItem dict         {items:8.0f} bytes/todo")
+    print(f"TodoRecord dict       {records:8.0f} bytes/todo   {items / records:.1f}x smaller")
+    print(f"InMemoryTodoStorage   {measure(build_storages, texts):8.0f} bytes/todo   (records + TodoIndex)")
+
+    storage = InMemoryTodoStorage()
+    for i in range(1_000):
+        storage.add(TodoRecord.new(f"Buy item number {i}"))
+    repeat = 100
+    start = time.perf_counter()
+    for _ in range(repeat):
+        storage.texts()
+    texts_us = (time.perf_counter() - start) / repeat * 1e6
+    start = time.perf_counter()
+    for _ in range(repeat):
+        [todo.to_item() for todo in storage.records()]
+    items_us = (time.perf_counter() - start) / repeat * 1e6
+    print(f"1,000 todos: list texts {texts_us:.0f} us, convert to TodoItem {items_us:.0f} us (API responses only)")
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Golden corpus check and throughput benchmark for todo text normalization
+
+Checks normalize.extract_action_and_item against normalize_golden.json, whose
+"legacy" fields record what the old list-scanning code returned for the
+substring false positives it got wrong ("forget" -> "get", "meeting" ->
+"meet"). Then times the old implementation against the new engine on
+distinct texts. LRU cache hits on repeated texts are reported separately,
+they measure the cache rather than the engine.
+
+Usage: python benchmarks/bench_normalize.py [iterations]
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import normalize
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "normalize_golden.json")
+
+
+def legacy_clean_todo_text(text: str) -> str:
+    """TodoAgent._clean_todo_text before normalize.py"""
+    filler_words = [
+        'add', 'need', 'want', 'should', 'must', 'have to',
+        'purchase', 'acquire', 'obtain', 'fetch', 'pick up', 'grab'
+    ]
+    articles_preps = [
+        'a', 'an', 'the', 'for', 'to', 'from', 'with', 'by', 'of', 'in', 'on', 'at'
+    ]
+    words = text.lower().strip().split()
+    filtered_words = []
+    for word in words:
+        if word not in filler_words and word not in articles_preps:
+            filtered_words.append(word)
+    if filtered_words:
+        cleaned_text = ' '.join(filtered_words)
+        return cleaned_text.capitalize()
+    else:
+        return text.strip()
+
+
+def legacy_extract_action_and_item(text: str) -> str:
+    """TodoAgent._extract_action_and_item before normalize.py"""
+    action_verbs = [
+        'buy', 'get', 'call', 'schedule', 'visit', 'meet', 'go to', 'attend',
+        'pick up', 'drop off', 'send', 'email', 'text', 'message', 'book',
+        'reserve', 'order', 'cook', 'clean', 'organize', 'plan', 'prepare'
+    ]
+    text_lower = text.lower().strip()
+    found_action = None
+    for action in action_verbs:
+        if action in text_lower:
+            found_action = action
+            break
+    if found_action:
+        action_pos = text_lower.find(found_action)
+        action_phrase = text[action_pos:]
+        words = action_phrase.lower().split()
+        filtered_words = []
+        for word in words:
+            if word not in ['i', 'need', 'want', 'should', 'must', 'have', 'to', 'a', 'an', 'the']:
+                filtered_words.append(word)
+        if filtered_words:
+            result = ' '.join(filtered_words)
+            return result.capitalize()
+    return legacy_clean_todo_text(text)
+
+
+def check_golden():
+    """Compare the engine with the golden corpus, returns the inputs and mismatches"""
+    with open(GOLDEN_PATH, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+    failures = []
+    for case in corpus:
+        actual = normalize.extract_action_and_item(case["input"])
+        if actual != case["expected"]:
+            failures.append((case["input"], case["expected"], actual))
+    fixed = sum(1 for case in corpus if "legacy" in case)
+    print(f"golden corpus: {len(corpus) - len(failures)}/{len(corpus)} match, "
+          f"{fixed} legacy false positives fixed")
+    for text, expected, actual in failures:
+        print(f"  MISMATCH {text!r}: expected {expected!r}, got {actual!r}")
+    return [case["input"] for case in corpus], failures
+
+
+def throughput(fn, texts, iterations: int) -> float:
+    """Texts normalized per second"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for text in texts:
+            fn(text)
+    return len(texts) * iterations / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    texts, failures = check_golden()
+    # Unique inputs so the per-text cache doesn't flatter the engine
+    unique = [f"{text} {i}" for i in range(iterations) for text in texts]
+
+    legacy = throughput(legacy_extract_action_and_item, unique, 1)
+    normalize.extract_action_and_item.cache_clear()
+    compiled = throughput(normalize.extract_action_and_item.__wrapped__, unique, 1)
+    batch_start = time.perf_counter()
+    normalize.normalize_many(unique)
+    batch = len(unique) / (time.perf_counter() - batch_start)
+    cached = throughput(normalize.extract_action_and_item, texts, iterations)
+
+    print(f"legacy list scans      {legacy:12,.0f} texts/s")
+    print(f"new engine (uncached) {compiled:12,.0f} texts/s ({compiled / legacy:.1f}x)")
+    print(f"normalize_many         {batch:12,.0f} texts/s ({batch / legacy:.1f}x)")
+    print(f"LRU hits on repeats    {cached:12,.0f} texts/s (cache lookups, not engine speed)")
+    sys.exit(1 if failures else 0)
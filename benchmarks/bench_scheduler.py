@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Burst coalescing and admission control of the message scheduler
+
+1. Bursts: every user sends "milk", "eggs" and "bread" at once. Compares
+   messages sent straight to the session agents (one model call each) with
+   the scheduler, with and without a coalescing window. Reports model calls,
+   the time until a burst's last reply and whether every item was added.
+2. Overload: many users send one message each while the model call budget
+   is small. Compares no limit with the degrade and reject modes.
+
+Runs against the local OpenAI stub, the decision cache is off.
+
+Usage: python benchmarks/bench_scheduler.py --users 100 --latency 0.3
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+# Identical bursts from different users would otherwise be cache hits
+os.environ["TODO_DECISION_CACHE"] = "0"
+
+import openai
+
+from load_test import percentile
+from scheduler import SHED, MessageScheduler
+from sessions import SessionManager
+from stub_openai import StubOpenAIServer
+
+BURST = ["milk", "eggs", "bread"]
+
+
+_clients = {}
+
+
+def make_sessions(stub: StubOpenAIServer) -> SessionManager:
+    """Fresh sessions, on clients shared by every run so their connections are reused"""
+    if stub not in _clients:
+        _clients[stub] = (
+            openai.OpenAI(base_url=stub.base_url, api_key="stub", max_retries=0),
+            openai.AsyncOpenAI(base_url=stub.base_url, api_key="stub", max_retries=0),
+        )
+    client, async_client = _clients[stub]
+    return SessionManager(client=client, async_client=async_client)
+
+
+async def direct(sessions: SessionManager, user: str, message: str) -> str:
+    """The handler before the scheduler: take the session lock and call the agent"""
+    async with sessions.session(user) as agent:
+        return await agent.process_message_async(message)
+
+
+async def bursts(stub: StubOpenAIServer, users: int, window: float = None):
+    sessions = make_sessions(stub)
+    scheduler = MessageScheduler(sessions, coalesce_window=window) if window is not None else None
+    durations = []
+
+    async def user(index: int):
+        start = time.perf_counter()
+        if scheduler is None:
+            await asyncio.gather(*(direct(sessions, f"u{index}", message) for message in BURST))
+        else:
+            await asyncio.gather(*(scheduler.submit(f"u{index}", message) for message in BURST))
+        durations.append(time.perf_counter() - start)
+
+    requests = stub.requests
+    await asyncio.gather(*(user(i) for i in range(users)))
+    complete = 0
+    for index in range(users):
+        async with sessions.session(f"u{index}") as agent:
+            texts = " ".join(agent.storage.texts()).lower()
+            complete += all(item in texts for item in BURST)
+    return stub.requests - requests, durations, complete
+
+
+async def overload(stub: StubOpenAIServer, users: int, max_concurrency: int, overload_mode: str):
+    sessions = make_sessions(stub)
+    scheduler = MessageScheduler(sessions, max_concurrency=max_concurrency, queue_limit=max_concurrency * 2,
+                                 queue_timeout=2.0, overload=overload_mode)
+    latencies = []
+
+    async def user(index: int):
+        start = time.perf_counter()
+        await scheduler.submit(f"o{index}", f"tickets for the show {index}")
+        latencies.append(time.perf_counter() - start)
+
+    requests, shed = stub.requests, SHED.value(mode=overload_mode)
+    await asyncio.gather(*(user(i) for i in range(users)))
+    return stub.requests - requests, latencies, SHED.value(mode=overload_mode) - shed
+
+
+async def main(args):
+    with StubOpenAIServer(latency=args.latency, seed=0) as stub:
+        # Warm up the clients and imports
+        await bursts(stub, 5, 0.0)
+
+        print(f"bursts: {args.users} users x {len(BURST)} messages, model latency {args.latency * 1000:.0f} ms")
+        print(f"{'mode':>20} {'model calls':>12} {'burst p50 ms':>13} {'burst p99 ms':>13} {'complete':>9}")
+        for label, window in (("direct", None), ("scheduler", 0.0), ("scheduler + 200ms", 0.2)):
+            calls, durations, complete = await bursts(stub, args.users, window)
+            print(f"{label:>20} {calls:>12} {percentile(durations, 50) * 1000:>13.0f} "
+                  f"{percentile(durations, 99) * 1000:>13.0f} {complete:>6}/{args.users}")
+
+        users = args.users * 4
+        print(f"\noverload: {users} users at once, model budget {args.max_concurrency} calls")
+        print(f"{'mode':>20} {'model calls':>12} {'p50 ms':>13} {'p99 ms':>13} {'shed':>9}")
+        for label, limit, mode in (("no limit", users, "degrade"),
+                                   ("degrade", args.max_concurrency, "degrade"),
+                                   ("reject", args.max_concurrency, "reject")):
+            calls, latencies, shed = await overload(stub, users, limit, mode)
+            print(f"{label:>20} {calls:>12} {percentile(latencies, 50) * 1000:>13.0f} "
+                  f"{percentile(latencies, 99) * 1000:>13.0f} {shed:>9.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scheduler coalescing and admission control")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.3, help="stub response delay in seconds")
+    parser.add_argument("--max-concurrency", type=int, default=16)
+    asyncio.run(main(parser.parse_args()))
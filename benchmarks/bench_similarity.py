@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for fuzzy and category matching
+
+Compares SimilarityIndex against a linear Python scan computing the same
+scores over the same features (sparse dicts instead of a NumPy matrix),
+checks both return the same matches, and times the first match() of a
+session (index build), a fuzzy delete through TodoAgent and a SQLite
+session's match() right after an add, which extends its index.
+
+Usage: python benchmarks/bench_similarity.py [sizes...]
+"""
+
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from categories import CATEGORY_BITS, categories_of, words
+from models import TodoRecord
+from similarity import _MASK, MATCH_THRESHOLD, STOP_WORDS, SimilarityIndex
+from storage import SqliteDatabase, SqliteTodoStorage
+from todo_agent import TodoAgent
+
+WORDS = [
+    "milk", "eggs", "bread", "dentist", "mom", "report", "tickets", "cake",
+    "balloons", "invoice", "car", "plants", "laundry", "passport", "gift",
+    "flight", "hotel", "meeting", "groceries", "coffee", "books", "keys",
+]
+VERBS = ["buy", "call", "schedule", "book", "order", "clean", "plan", "send"]
+QUERIES = 50
+
+
+def make_texts(n: int):
+    rng = random.Random(n)
+    return [f"{rng.choice(VERBS)} {rng.choice(WORDS)} {i}" for i in range(n)]
+
+
+def typo(word: str, rng: random.Random) -> str:
+    index = rng.randrange(len(word))
+    return word[:index] + word[index + 1:]
+
+
+def sparse_vector(text: str) -> Counter:
+    """The features of similarity.vectorize, before normalizing"""
+    features = Counter()
+    for word in words(text):
+        if word in STOP_WORDS:
+            continue
+        padded = f" {word} "
+        for n in (2, 3):
+            for i in range(len(padded) - n + 1):
+                features[zlib.crc32(padded[i:i + n].encode("utf-8")) & _MASK] += 1
+    return features
+
+
+class LinearScan:
+    """What matching looks like without NumPy: one Python loop over every todo"""
+
+    def __init__(self, todos):
+        self.rows = []
+        self.df = Counter()
+        for todo_id, text in todos:
+            features = sparse_vector(text)
+            norm = math.sqrt(sum(count * count for count in features.values())) or 1.0
+            self.rows.append((todo_id, {f: count / norm for f, count in features.items()}, categories_of(text)))
+            self.df.update(features.keys())
+
+    def search(self, query: str):
+        total = len(self.rows)
+        weighted = {f: count * (math.log((1.0 + total) / (1.0 + self.df[f])) + 1.0)
+                    for f, count in sparse_vector(query).items()}
+        norm = math.sqrt(sum(value * value for value in weighted.values()))
+        if not norm:
+            return []
+        scored = []
+        for todo_id, vector, _ in self.rows:
+            score = sum(value * vector.get(f, 0.0) for f, value in weighted.items()) / norm
+            if score >= MATCH_THRESHOLD:
+                scored.append((score, todo_id))
+        scored.sort(key=lambda item: -item[0])
+        return [todo_id for _, todo_id in scored]
+
+    def in_categories(self, mask: int):
+        return [todo_id for todo_id, _, categories in self.rows if categories & mask]
+
+
+def timed(fn, args):
+    start = time.perf_counter()
+    results = [fn(arg) for arg in args]
+    return (time.perf_counter() - start) / len(args), results
+
+
+def run(n: int):
+    texts = make_texts(n)
+    todos = list(enumerate(texts))
+    rng = random.Random(0)
+    queries = [f"{typo(rng.choice(WORDS), rng)} {rng.randrange(n)}" for _ in range(QUERIES)]
+    masks = [CATEGORY_BITS["groceries"], CATEGORY_BITS["party"] | CATEGORY_BITS["travel"]] * (QUERIES // 2)
+
+    index = SimilarityIndex()
+    start = time.perf_counter()
+    index.rebuild(todos)
+    build = time.perf_counter() - start
+    scan = LinearScan(todos)
+
+    linear_fuzzy, expected = timed(scan.search, queries)
+    vector_fuzzy, actual = timed(lambda q: [todo_id for todo_id, _ in index.search(q)], queries)
+    # float32 vs float64 can reorder near-ties, the matched sets must agree
+    assert [set(ids) for ids in expected] == [set(ids) for ids in actual], "fuzzy matches differ"
+
+    linear_category, expected = timed(scan.in_categories, masks)
+    vector_category, actual = timed(index.in_categories, masks)
+    assert expected == actual, "category matches differ"
+
+    agent = TodoAgent()
+    for text in texts:
+        agent.add_todo(text)
+    delete_queries = [f"{typo(word, rng)} {rng.randrange(n)}" for word in rng.choices(WORDS, k=QUERIES)]
+    agent.storage.match("warm up")
+    delete, _ = timed(agent.delete_todo, delete_queries)
+
+    with tempfile.TemporaryDirectory() as directory:
+        storage = SqliteTodoStorage(SqliteDatabase(os.path.join(directory, "todos.db")), "bench")
+        storage.add_many([TodoRecord.new(text) for text in texts])
+        storage.match("warm up")
+        after_add = []
+        for query in queries[:10]:
+            storage.add(TodoRecord.new(f"new {query}"))
+            start = time.perf_counter()
+            storage.match(query)
+            after_add.append(time.perf_counter() - start)
+        sqlite_match = statistics.median(after_add)
+
+    print(f"{n:>8} todos | build {build * 1000:8.1f}ms | fuzzy {linear_fuzzy * 1000:9.2f}ms -> "
+          f"{vector_fuzzy * 1000:7.2f}ms ({linear_fuzzy / vector_fuzzy:4.0f}x) | category "
+          f"{linear_category * 1000:7.2f}ms -> {vector_category * 1000:6.2f}ms "
+          f"({linear_category / vector_category:3.0f}x) | fuzzy delete {delete * 1000:6.2f}ms | "
+          f"SQLite match after add {sqlite_match * 1000:6.2f}ms")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    for size in sizes:
+        run(size)
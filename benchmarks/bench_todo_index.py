@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the todo index
+
+Compares duplicate checks and substring deletes against the linear scans
+TodoAgent used before the index, and checks both return the same results.
+
+Usage: python benchmarks/bench_todo_index.py [sizes...]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from todo_agent import TodoAgent
+
+WORDS = [
+    "milk", "eggs", "bread", "dentist", "mom", "report", "tickets", "cake",
+    "balloons", "invoice", "car", "plants", "laundry", "passport", "gift",
+    "flight", "hotel", "meeting", "groceries", "coffee", "books", "keys",
+]
+VERBS = ["buy", "call", "schedule", "book", "order", "clean", "plan", "send"]
+QUERIES = 200
+
+
+def make_texts(n: int):
+    rng = random.Random(n)
+    return [f"{rng.choice(VERBS)} {rng.choice(WORDS)} {i}" for i in range(n)]
+
+
+def linear_duplicate(agent: TodoAgent, text: str):
+    for existing_todo in agent.storage.todos.values():
+        if existing_todo.text.lower() == text.lower():
+            return existing_todo.id
+    return None
+
+
+def linear_search(agent: TodoAgent, text: str):
+    return [todo_id for todo_id, todo in agent.storage.todos.items() if text.lower() in todo.text.lower()]
+
+
+def timed(fn, args):
+    start = time.perf_counter()
+    results = [fn(*a) for a in args]
+    return (time.perf_counter() - start) / len(args), results
+
+
+def run(n: int):
+    agent = TodoAgent()
+    for text in make_texts(n):
+        agent.add_todo(text)
+
+    rng = random.Random(0)
+    todos = list(agent.storage.todos.values())
+    # Half hits, half misses for the duplicate check
+    dup_queries = [(rng.choice(todos).text.upper(),) for _ in range(QUERIES // 2)]
+    dup_queries += [(f"buy nothing {i}",) for i in range(QUERIES // 2)]
+    # Selective queries like a delete from chat, plus a few broad ones
+    search_queries = [(f"{rng.choice(WORDS)} {rng.randrange(n)}",) for _ in range(QUERIES - 10)]
+    search_queries += [(rng.choice(WORDS),) for _ in range(10)]
+
+    linear_dup, expected_dup = timed(lambda t: linear_duplicate(agent, t), dup_queries)
+    index_dup, actual_dup = timed(lambda t: agent.storage.index.find_duplicate(t), dup_queries)
+    assert expected_dup == actual_dup, "duplicate lookups differ"
+
+    linear_del, expected_del = timed(lambda t: linear_search(agent, t), search_queries)
+    index_del, actual_del = timed(agent.find_matching_ids, search_queries)
+    assert expected_del == actual_del, "substring matches differ"
+
+    print(f"{n:>8} todos | duplicate check {linear_dup * 1e6:10.1f}us -> {index_dup * 1e6:7.2f}us "
+          f"({linear_dup / index_dup:7.0f}x) | delete match {linear_del * 1e6:10.1f}us -> "
+          f"{index_del * 1e6:8.1f}us ({linear_del / index_del:5.1f}x)")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    for size in sizes:
+        run(size)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Tail latency with and without hedging, and behaviour during an upstream outage
+
+Runs TodoAgents against the local OpenAI stub with injected faults:
+
+1. A latency tail, a share of responses take --slow-latency seconds.
+   Compares p50/p95/p99 with hedging off and on.
+2. An outage, every upstream call fails with a 503. Reports how many calls
+   reach the upstream once the breaker opens, how fast messages are answered
+   by the local fallback and whether adds still land on the list. The stub
+   then recovers and the breaker is expected to close again.
+
+Usage: python benchmarks/bench_transport.py --messages 400 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+import openai
+
+from load_test import percentile
+from stub_openai import StubOpenAIServer
+from todo_agent import TodoAgent
+from transport import FALLBACKS, HEDGES, CircuitBreaker, Transport
+
+
+def make_transport(stub: StubOpenAIServer, **kwargs) -> Transport:
+    return Transport(
+        openai.OpenAI(base_url=stub.base_url, api_key="stub", max_retries=0),
+        openai.AsyncOpenAI(base_url=stub.base_url, api_key="stub", max_retries=0),
+        **kwargs,
+    )
+
+
+def make_agent(transport: Transport) -> TodoAgent:
+    agent = TodoAgent(transport=transport)
+    # Every message goes to the model
+    agent.fast_path_enabled = False
+    agent.decision_cache = None
+    return agent
+
+
+async def drive(transport: Transport, messages: int, concurrency: int, prefix: str):
+    """Send one add per fresh session, returns (latencies, agents)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    agents = []
+
+    async def one(index: int):
+        agent = make_agent(transport)
+        agents.append(agent)
+        async with semaphore:
+            start = time.perf_counter()
+            await agent.process_message_async(f"add buy {prefix} item {index}")
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(i) for i in range(messages)))
+    return latencies, agents
+
+
+async def bench_tail(stub: StubOpenAIServer, args):
+    stub.slow_rate = args.slow_rate
+    stub.slow_latency = args.slow_latency
+    print(f"latency tail: {args.latency * 1000:.0f} ms typical, {args.slow_rate:.0%} take {args.slow_latency:.1f} s")
+    print(f"{'hedging':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'upstream':>9} {'hedges':>7} {'won':>5}")
+    for hedge in (False, True):
+        transport = make_transport(stub, hedge=hedge, hedge_percentile=args.hedge_percentile, deadline=10)
+        # Fill the latency window so the hedge threshold is known
+        await drive(transport, 200, args.concurrency, "warmup")
+        requests, sent, won = stub.requests, HEDGES.value(outcome="sent"), HEDGES.value(outcome="won")
+        latencies, _ = await drive(transport, args.messages, args.concurrency, f"tail-{hedge}")
+        print(f"{'on' if hedge else 'off':>8} {percentile(latencies, 50) * 1000:>9.0f} "
+              f"{percentile(latencies, 95) * 1000:>9.0f} {percentile(latencies, 99) * 1000:>9.0f} "
+              f"{stub.requests - requests:>9} {HEDGES.value(outcome='sent') - sent:>7.0f} "
+              f"{HEDGES.value(outcome='won') - won:>5.0f}")
+    stub.slow_rate = 0.0
+
+
+async def bench_outage(stub: StubOpenAIServer, args):
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=1.0)
+    transport = make_transport(stub, breaker=breaker, deadline=5)
+    await drive(transport, 20, args.concurrency, "warmup")
+    stub.error_rate = 1.0
+    requests, fallbacks = stub.requests, FALLBACKS.value(reason="breaker_open") + FALLBACKS.value(reason="upstream_error")
+    latencies, agents = await drive(transport, args.messages, args.concurrency, "outage")
+    landed = sum(agent.storage.count() for agent in agents)
+    fallbacks = FALLBACKS.value(reason="breaker_open") + FALLBACKS.value(reason="upstream_error") - fallbacks
+    print(f"\noutage: every upstream call fails, {args.messages} messages")
+    print(f"  upstream calls {stub.requests - requests}, local fallbacks {fallbacks:.0f}, breaker {breaker.state}")
+    print(f"  p50 {percentile(latencies, 50) * 1000:.1f} ms, p99 {percentile(latencies, 99) * 1000:.1f} ms, "
+          f"adds applied {landed}/{args.messages}")
+
+    stub.error_rate = 0.0
+    await asyncio.sleep(breaker.reset_timeout)
+    latencies, _ = await drive(transport, 20, 1, "recovered")
+    print(f"recovered: breaker {breaker.state}, p50 {percentile(latencies, 50) * 1000:.0f} ms")
+
+
+async def main(args):
+    with StubOpenAIServer(latency=args.latency, seed=0) as stub:
+        await bench_tail(stub, args)
+        await bench_outage(stub, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hedging and circuit breaker behaviour")
+    parser.add_argument("--messages", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05, help="typical stub response delay in seconds")
+    parser.add_argument("--slow-rate", type=float, default=0.02,
+                        help="share of slow responses, hedging only helps while this is well below 1 - percentile")
+    parser.add_argument("--hedge-percentile", type=float, default=95)
+    parser.add_argument("--slow-latency", type=float, default=1.0, help="delay of slow responses in seconds")
+    asyncio.run(main(parser.parse_args()))
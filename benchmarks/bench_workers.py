@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Throughput of the HTTP server with 1 vs N uvicorn workers
+
+Starts the stub OpenAI server, then runs main.py with each worker count
+against a fresh SQLite database (TODO_DATABASE), drives it with the load
+test's scripted conversations over HTTP and reports requests per second and
+latency. Expect scaling up to the number of CPU cores.
+
+Usage: python benchmarks/bench_workers.py --workers 1 2 4 --concurrency 50 --users 200
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from load_test import HttpTarget, run_level
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+async def measure(workers: int, stub_url: str, args, directory: str):
+    port = free_port()
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY="stub",
+        OPENAI_BASE_URL=stub_url,
+        TODO_DATABASE=os.path.join(directory, f"todos-{workers}.db"),
+        TODO_WORKERS=str(workers),
+        TODO_PORT=str(port),
+    )
+    server = subprocess.Popen([sys.executable, "main.py"], cwd=ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up(f"http://127.0.0.1:{port}/health")
+        target = HttpTarget(f"http://127.0.0.1:{port}/chat")
+        try:
+            # Warm up every worker's imports and connections first
+            await run_level(target, args.concurrency, args.concurrency, prefix=f"warmup-{workers}")
+            return await run_level(target, args.concurrency, args.users, prefix=f"w{workers}")
+        finally:
+            await target.close()
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+async def main(args):
+    directory = tempfile.mkdtemp(prefix="todo-workers-")
+    stub_port = free_port()
+    stub = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, "stub_openai.py"), "--port", str(stub_port),
+         "--latency", str(args.latency)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    stub_url = f"http://127.0.0.1:{stub_port}/v1"
+    try:
+        print(f"cpus={os.cpu_count()} concurrency={args.concurrency} users={args.users} stub latency={args.latency}s")
+        print(f"{'workers':>8} {'reqs':>7} {'errors':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        baseline = None
+        for workers in args.workers:
+            result = await measure(workers, stub_url, args, directory)
+            baseline = baseline or result["rps"]
+            print(f"{workers:>8} {result['requests']:>7} {result['errors']:>6} {result['rps']:>9.1f} "
+                  f"{result['p50'] * 1000:>9.1f} {result['p95'] * 1000:>9.1f} {result['p99'] * 1000:>9.1f}"
+                  f"   {result['rps'] / baseline:.2f}x")
+    finally:
+        stub.terminate()
+        stub.wait(timeout=30)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="1 vs N worker throughput")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 2])
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=200, help="conversations per run")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub response delay in seconds")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Offline load test for the todo bot
+
+Replays scripted multi-user conversations against todo_agent_bot in-process
+(with the OpenAI clients pointed at the local stub server), or against a
+running /chat endpoint over HTTP. Reports p50/p95/p99 latency and requests
+per second for each concurrency level, and memory per session in-process.
+
+In-process, each level runs with the fast path on and off (--fast-path), and
+the decision cache is off unless --decision-cache is given, so the numbers
+are for the model path. Next to the latencies are the model calls the stub
+served, the share of messages the fast path answered and the decision cache
+hit rate.
+
+Usage:
+    python benchmarks/load_test.py --concurrency 1 10 50 100 --latency 0.3
+    python benchmarks/load_test.py --fast-path off --decision-cache
+    python benchmarks/load_test.py --target http --url http://localhost:8000/chat
+"""
+
+import argparse
+import asyncio
+import gc
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from stub_openai import StubOpenAIServer
+
+# Each simulated user runs one script from start to end
+SCRIPTS: Dict[str, List[str]] = {
+    "readme": [
+        "hello",
+        "I need to buy milk",
+        "also eggs",
+        "Show me my list",
+        "Remove eggs",
+        "Show me my list",
+        "thank you",
+    ],
+    "groceries": [
+        "I need milk, bread, and eggs",
+        "add buy apples",
+        "what's on my list?",
+        "remove bread",
+        "I should call the dentist tomorrow",
+        "show my list",
+    ],
+    "bulk": [
+        "add buy milk",
+        "add call mom",
+        "clear all",
+        "yes",
+        "show my list",
+    ],
+}
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class InProcessTarget:
+    """Calls the Bubbletea handler directly, with OpenAI traffic going to the stub"""
+
+    def __init__(self, stub: StubOpenAIServer):
+        import openai
+        import main
+        from decision_cache import shared_decision_cache
+        from intent import fast_path_stats
+        from transport import Transport
+
+        self.main = main
+        self.stub = stub
+        self.fast_path_stats = fast_path_stats
+        self.decision_cache = shared_decision_cache()
+        stub_url = stub.base_url
+        # Point every session's clients at the stub
+        manager = main.session_manager
+        manager.transport = Transport(
+            openai.OpenAI(base_url=stub_url, api_key="stub", max_retries=0),
+            openai.AsyncOpenAI(base_url=stub_url, api_key="stub", max_retries=0),
+        )
+
+    async def send(self, message: str, user_id: str) -> str:
+        result = await self.main.todo_agent_bot(message, user_uuid=user_id)
+        if isinstance(result, list):
+            return "".join(component.content for component in result)
+        return "".join([component.content async for component in result])
+
+    def counters(self) -> Dict[str, int]:
+        """Model calls and fast path / decision cache counts so far, run_level reports the difference"""
+        cache = self.decision_cache.stats() if self.decision_cache is not None else {"hits": 0, "misses": 0}
+        return {
+            "model_calls": self.stub.requests,
+            "local": self.fast_path_stats.local,
+            "remote": self.fast_path_stats.remote,
+            "cache_hits": cache["hits"],
+            "cache_lookups": cache["hits"] + cache["misses"],
+        }
+
+    async def close(self):
+        pass
+
+
+class HttpTarget:
+    """Posts to a running /chat endpoint"""
+
+    def __init__(self, url: str):
+        import aiohttp
+
+        self.url = url
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0))
+
+    async def send(self, message: str, user_id: str) -> str:
+        async with self.session.post(self.url, json={"type": "user", "message": message, "user_uuid": user_id}) as response:
+            response.raise_for_status()
+            return await response.text()
+
+    def counters(self) -> Dict[str, int]:
+        # Only the server knows, see its /metrics
+        return {}
+
+    async def close(self):
+        await self.session.close()
+
+
+async def run_level(target, concurrency: int, users: int, prefix: str) -> Dict[str, float]:
+    """Run `users` conversations with at most `concurrency` in flight"""
+    latencies: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    scripts = list(SCRIPTS.values())
+
+    async def conversation(index: int):
+        nonlocal errors
+        script = scripts[index % len(scripts)]
+        async with semaphore:
+            for message in script:
+                start = time.perf_counter()
+                try:
+                    await target.send(message, f"{prefix}-{index}")
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+    before = target.counters()
+    start = time.perf_counter()
+    await asyncio.gather(*(conversation(i) for i in range(users)))
+    elapsed = time.perf_counter() - start
+    counts = {name: value - before[name] for name, value in target.counters().items()}
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "mean": statistics.fmean(latencies) if latencies else 0.0,
+        "model_calls": counts.get("model_calls"),
+        "local_rate": _rate(counts.get("local"), counts.get("local", 0) + counts.get("remote", 0)),
+        "cache_rate": _rate(counts.get("cache_hits"), counts.get("cache_lookups")),
+    }
+
+
+def _rate(part: Optional[int], total: Optional[int]) -> Optional[float]:
+    return part / total if total else None
+
+
+def _share(rate: Optional[float]) -> str:
+    return "-" if rate is None else f"{rate:.0%}"
+
+
+async def measure_session_memory(target: InProcessTarget, sessions: int) -> float:
+    """Bytes allocated per resident session after running the scripts"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    await run_level(target, concurrency=50, users=sessions, prefix="memory")
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return allocated / sessions
+
+
+async def main(args):
+    stub = None
+    if args.target == "inproc":
+        # Read by each session's TodoAgent, so set before any is created. A shared cache would answer
+        # every repeat of a script message and the stub would see almost none of them
+        os.environ["TODO_DECISION_CACHE"] = "1" if args.decision_cache else "0"
+        stub = StubOpenAIServer(latency=args.latency, jitter=args.jitter, cassette=args.cassette, seed=0).start()
+        target = InProcessTarget(stub)
+        modes = ["on", "off"] if args.fast_path == "both" else [args.fast_path]
+    else:
+        target = HttpTarget(args.url)
+        # The server's own TODO_FAST_PATH applies
+        modes = ["server"]
+
+    print(f"target={args.target} users/level={args.users} stub latency={args.latency}s "
+          f"decision cache={'on' if args.decision_cache else 'off'}")
+    print(f"{'fast':>6} {'conc':>6} {'reqs':>7} {'errors':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'model':>7} {'local':>6} {'cached':>6}")
+    try:
+        for mode in modes:
+            if mode != "server":
+                os.environ["TODO_FAST_PATH"] = "1" if mode == "on" else "0"
+            for concurrency in args.concurrency:
+                result = await run_level(target, concurrency, args.users, prefix=f"{mode}-c{concurrency}")
+                model_calls = "-" if result["model_calls"] is None else result["model_calls"]
+                print(f"{mode:>6} {result['concurrency']:>6} {result['requests']:>7} {result['errors']:>6} "
+                      f"{result['rps']:>9.1f} {result['p50'] * 1000:>9.1f} {result['p95'] * 1000:>9.1f} "
+                      f"{result['p99'] * 1000:>9.1f} {model_calls:>7} {_share(result['local_rate']):>6} "
+                      f"{_share(result['cache_rate']):>6}")
+
+        if args.target == "inproc" and args.memory_sessions:
+            per_session = await measure_session_memory(target, args.memory_sessions)
+            print(f"memory per session: {per_session / 1024:.1f} KiB ({args.memory_sessions} sessions)")
+        if stub is not None:
+            print(f"stub requests served: {stub.requests}")
+    finally:
+        await target.close()
+        if stub is not None:
+            stub.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline load test for the todo bot")
+    parser.add_argument("--target", choices=["inproc", "http"], default="inproc")
+    parser.add_argument("--url", default="http://localhost:8000/chat", help="chat endpoint for --target http")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50, 100])
+    parser.add_argument("--users", type=int, default=200, help="conversations per concurrency level")
+    parser.add_argument("--latency", type=float, default=0.2, help="stub response delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05, help="stub delay standard deviation")
+    parser.add_argument("--cassette", help="replay stub responses from a recorded cassette")
+    parser.add_argument("--fast-path", choices=["on", "off", "both"], default="both",
+                        help="run with the local fast path on, off or both (in-process only)")
+    parser.add_argument("--decision-cache", action="store_true",
+                        help="keep the shared decision cache on, by default it is off so messages reach the stub")
+    parser.add_argument("--memory-sessions", type=int, default=500, help="sessions to measure memory with, 0 to skip")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Behavioral regression suite for the prompt modes
+
+Replays the README's example conversations through TodoAgent once per prompt
+mode, with the fast path off so every message that can reach the model does.
+After each turn the todo list is checked against what the conversation should
+have produced. Reports prompt tokens per model call and the share served from
+the provider's prompt cache, so "full" and "compact" can be compared.
+
+Needs OPENAI_API_KEY for the real model, or --stub to run against the local
+stub server (which checks the plumbing, not the prompt).
+
+Usage:
+    python benchmarks/prompt_regression.py --modes full compact --repeat 2
+    python benchmarks/prompt_regression.py --stub
+"""
+
+import argparse
+import os
+import sys
+from typing import List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Each turn lists substrings the todos must contain afterwards, one per todo
+CONVERSATIONS: List[List[Tuple[str, List[str]]]] = [
+    [
+        ("I need to buy milk", ["buy milk"]),
+        ("also eggs", ["buy milk", "eggs"]),
+        ("Show me my list", ["buy milk", "eggs"]),
+        ("Remove eggs", ["buy milk"]),
+        ("Show me my list", ["buy milk"]),
+    ],
+    [
+        ("I should call the dentist tomorrow", ["call", "dentist"]),
+        ("I need milk, bread, and eggs", ["dentist", "milk", "bread", "eggs"]),
+        ("delete bread", ["dentist", "milk", "eggs"]),
+    ],
+    [
+        ("add buy mango", ["buy mango"]),
+        ("hello", ["buy mango"]),
+        ("how are you?", ["buy mango"]),
+        ("thank you", ["buy mango"]),
+        ("remove all", ["buy mango"]),
+        ("yes", []),
+    ],
+]
+
+
+def check_todos(texts: List[str], expected: List[str]) -> bool:
+    """Whether every expected substring matches a distinct todo, with no extras"""
+    if len(texts) != len(expected):
+        # "call" and "dentist" describe the same todo
+        expected = [term for term in expected if term != "call"] if "dentist" in expected else expected
+        if len(texts) != len(expected):
+            return False
+    remaining = [text.lower() for text in texts]
+    for term in expected:
+        match = next((text for text in remaining if term in text), None)
+        if match is None:
+            return False
+        remaining.remove(match)
+    return True
+
+
+def run_mode(mode: str, client, async_client, repeat: int) -> Tuple[int, int, float, float]:
+    """Returns (failed turns, model calls, prompt tokens per call, cached share)"""
+    from metrics import LLM_TOKENS
+    from prompts import get_prompt
+    from todo_agent import TodoAgent
+
+    prompt_before = LLM_TOKENS.value(type="prompt")
+    cached_before = LLM_TOKENS.value(type="cached")
+    calls = 0
+    failures = 0
+    for _ in range(repeat):
+        for conversation in CONVERSATIONS:
+            agent = TodoAgent(client=client, async_client=async_client)
+            agent.prompt = get_prompt(mode)
+            agent.tools = agent.prompt.tools
+            agent.fast_path_enabled = False
+            # Cached decisions would skip the model on repeats
+            agent.decision_cache = None
+            for message, expected in conversation:
+                prompt_tokens = LLM_TOKENS.value(type="prompt")
+                reply = agent.process_message(message)
+                if LLM_TOKENS.value(type="prompt") != prompt_tokens:
+                    calls += 1
+                texts = [todo.text for todo in agent.get_all_todos()]
+                if not check_todos(texts, expected):
+                    failures += 1
+                    print(f"  [{mode}] FAIL {message!r}: todos {texts}, expected {expected}, reply {reply!r}")
+
+    prompt_tokens = LLM_TOKENS.value(type="prompt") - prompt_before
+    cached_tokens = LLM_TOKENS.value(type="cached") - cached_before
+    return failures, calls, prompt_tokens / (calls or 1), cached_tokens / (prompt_tokens or 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prompt mode regression suite")
+    parser.add_argument("--modes", nargs="+", default=["full", "compact"])
+    parser.add_argument("--repeat", type=int, default=2, help="runs per mode, later runs show cache hits")
+    parser.add_argument("--stub", action="store_true", help="use the local stub server instead of OpenAI")
+    args = parser.parse_args()
+
+    import openai
+    from dotenv import load_dotenv
+
+    # todo_agent no longer loads .env on import, main.py does for the server
+    load_dotenv()
+
+    stub = None
+    if args.stub:
+        from stub_openai import StubOpenAIServer
+
+        stub = StubOpenAIServer(seed=0).start()
+        client = openai.OpenAI(base_url=stub.base_url, api_key="stub", max_retries=0)
+        async_client = openai.AsyncOpenAI(base_url=stub.base_url, api_key="stub", max_retries=0)
+    elif not os.getenv("OPENAI_API_KEY"):
+        sys.exit("OPENAI_API_KEY is not set, use --stub to run offline")
+    else:
+        client = openai.OpenAI()
+        async_client = openai.AsyncOpenAI()
+
+    total_failures = 0
+    print(f"{'mode':>8} {'turns failed':>13} {'calls':>6} {'prompt tok/call':>16} {'cached':>7}")
+    try:
+        for mode in args.modes:
+            failures, calls, per_call, cached = run_mode(mode, client, async_client, args.repeat)
+            total_failures += failures
+            print(f"{mode:>8} {failures:>13} {calls:>6} {per_call:>16.0f} {cached:>7.0%}")
+    finally:
+        if stub is not None:
+            stub.stop()
+    sys.exit(1 if total_failures else 0)
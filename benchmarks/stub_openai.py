@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI chat completions endpoint
+
+Answers POST /v1/chat/completions with tool calls picked by simple rules,
+or replays recorded responses from a cassette, after a configurable delay.
+Supports both regular and streamed (stream=true) responses, so benchmarks
+can drive the agent without network access or API credits.
+
+Usage:
+    python benchmarks/stub_openai.py --port 8089 --latency 0.4 --jitter 0.1
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 python main.py
+
+Cassettes are JSON lines files, one {"key": ..., "response": ...} object per
+line, where key is the last user message lowercased and stripped and response
+is a chat.completion body. Use --record to write one from the rule replies.
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+LIST_WORDS = ("show", "list", "display", "what's on", "what is on", "what's left", "how many")
+DELETE_PREFIX = re.compile(r"^(?:please\s+)?(?:remove|delete|cross off)\s+(?:the\s+)?(.+)$")
+ADD_PREFIX = re.compile(
+    r"^(?:please\s+)?(?:add|also|i need to|i need|i have to|i should|i must|i want to|need|remind me to)\s+(.+)$"
+)
+
+
+def cassette_key(messages: List[Dict[str, Any]]) -> str:
+    """Key a request by its last user message"""
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            # Lines stay separate, coalesced messages are one per line
+            lines = str(message.get("content", "")).lower().splitlines()
+            return "\n".join(" ".join(line.split()) for line in lines if line.strip())
+    return ""
+
+
+def rule_tool_calls(message: str) -> List[Dict[str, Any]]:
+    """Pick tool calls the way the real model usually would for common phrasings"""
+    if "\n" in message:
+        return [call for line in message.split("\n") for call in rule_tool_calls(line)]
+    text = " ".join(message.lower().split()).rstrip(".!?")
+    if any(word in text for word in LIST_WORDS):
+        return [{"name": "list_todos", "arguments": {}}]
+
+    match = DELETE_PREFIX.match(text)
+    if match:
+        return [{"name": "delete_todo", "arguments": {"text": match.group(1)}}]
+
+    match = ADD_PREFIX.match(text)
+    if match is None and message.rstrip().endswith("?"):
+        # Small talk like "how are you?", the prompt says to list the todos
+        return [{"name": "list_todos", "arguments": {}}]
+    items = match.group(1) if match else text
+    parts = [part.strip() for part in re.split(r",|\band\b", items) if part.strip()]
+    calls = []
+    for part in parts:
+        # Mirror the prompt's rule of keeping or inferring an action verb
+        if part.split()[0] not in ("buy", "call", "schedule", "book", "get", "send", "clean", "order"):
+            part = f"buy {part}"
+        calls.append({"name": "add_todo", "arguments": {"text": part}})
+    # The prompt tells the model to list the todos when it can't decide
+    return calls or [{"name": "list_todos", "arguments": {}}]
+
+
+def completion_body(model: str, tool_calls: List[Dict[str, Any]], content: Optional[str] = None,
+                    prompt_tokens: int = 0) -> Dict[str, Any]:
+    message: Dict[str, Any] = {"role": "assistant", "content": content}
+    if tool_calls:
+        message["tool_calls"] = [
+            {
+                "id": f"call_{uuid.uuid4().hex[:24]}",
+                "type": "function",
+                "function": {"name": call["name"], "arguments": json.dumps(call["arguments"])},
+            }
+            for call in tool_calls
+        ]
+    completion_tokens = 8 * max(1, len(tool_calls)) if tool_calls else len((content or "").split())
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": message,
+            "finish_reason": "tool_calls" if tool_calls else "stop",
+            "logprobs": None,
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": 0},
+        },
+    }
+
+
+def stream_chunks(body: Dict[str, Any], fragment_size: int = 8) -> List[Dict[str, Any]]:
+    """Split a completion into chat.completion.chunk events like the real API"""
+    base = {"id": body["id"], "object": "chat.completion.chunk", "created": body["created"], "model": body["model"]}
+    message = body["choices"][0]["message"]
+    chunks = []
+
+    def chunk(delta, finish_reason=None):
+        chunks.append(dict(base, choices=[{"index": 0, "delta": delta, "finish_reason": finish_reason}]))
+
+    chunk({"role": "assistant", "content": ""})
+    content = message.get("content") or ""
+    for start in range(0, len(content), fragment_size):
+        chunk({"content": content[start:start + fragment_size]})
+    for index, call in enumerate(message.get("tool_calls") or []):
+        chunk({"tool_calls": [{"index": index, "id": call["id"], "type": "function",
+                               "function": {"name": call["function"]["name"], "arguments": ""}}]})
+        arguments = call["function"]["arguments"]
+        for start in range(0, len(arguments), fragment_size):
+            chunk({"tool_calls": [{"index": index, "function": {"arguments": arguments[start:start + fragment_size]}}]})
+    chunk({}, body["choices"][0]["finish_reason"])
+    return chunks
+
+
+class _Server(ThreadingHTTPServer):
+    # Bursts of concurrent clients overflow the default listen backlog of 5
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class StubOpenAIServer:
+    """Threaded HTTP server imitating /v1/chat/completions"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 cassette: str = None, record: str = None, strict: bool = False, seed: int = None,
+                 slow_rate: float = 0.0, slow_latency: float = 1.0, error_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        # Fault injection: a share of slow responses (a latency tail) and of 503 errors
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.strict = strict
+        self.record_path = record
+        self.cassette: Dict[str, Dict[str, Any]] = {}
+        if cassette:
+            with open(cassette, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.cassette[entry["key"]] = entry["response"]
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        # Hashes of the request prefixes seen so far, for the simulated prompt cache
+        self._prefixes = set()
+        self.httpd = _Server((host, port), self._handler_class())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _delay(self) -> float:
+        with self._lock:
+            if self.slow_rate and self._random.random() < self.slow_rate:
+                return self.slow_latency
+            return max(0.0, self._random.gauss(self.latency, self.jitter)) if self.jitter else self.latency
+
+    def _fails(self) -> bool:
+        with self._lock:
+            return bool(self.error_rate) and self._random.random() < self.error_rate
+
+    def _cached_tokens(self, request: Dict[str, Any]) -> int:
+        """Mimic the provider's prefix cache: a repeated tools + system prefix of 1024+ tokens hits"""
+        messages = request.get("messages", [])
+        prefix = json.dumps(request.get("tools", [])) + json.dumps(messages[:1])
+        tokens = len(prefix) // 4
+        with self._lock:
+            seen = hash(prefix) in self._prefixes
+            self._prefixes.add(hash(prefix))
+        # Cached in 128 token blocks
+        return tokens // 128 * 128 if seen and tokens >= 1024 else 0
+
+    def respond(self, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Build the completion body for a request, None when strict replay misses"""
+        with self._lock:
+            self.requests += 1
+        messages = request.get("messages", [])
+        key = cassette_key(messages)
+        if key in self.cassette:
+            return self.cassette[key]
+        if self.strict:
+            return None
+
+        # Roughly 4 characters per token, good enough for relative comparisons
+        prompt_tokens = len(json.dumps(messages)) // 4 + len(json.dumps(request.get("tools", []))) // 4
+        body = completion_body(request.get("model", "gpt-4o"), rule_tool_calls(key), prompt_tokens=prompt_tokens)
+        body["usage"]["prompt_tokens_details"]["cached_tokens"] = self._cached_tokens(request)
+        if self.record_path:
+            with self._lock, open(self.record_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "response": body}) + "\n")
+        return body
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, payload: Dict[str, Any]):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                try:
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up, e.g. a cancelled hedged request
+                    pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+                    return
+
+                body = stub.respond(request)
+                time.sleep(stub._delay())
+                if stub._fails():
+                    self._send_json(503, {"error": {"message": "Injected upstream failure"}})
+                    return
+                if body is None:
+                    self._send_json(404, {"error": {"message": "No cassette entry for request"}})
+                    return
+                if not request.get("stream"):
+                    self._send_json(200, body)
+                    return
+
+                # Server-sent events, the connection is closed to end the stream
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for event in stream_chunks(body):
+                    self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+    def start(self) -> "StubOpenAIServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "StubOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0, help="mean response delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="standard deviation of the delay")
+    parser.add_argument("--cassette", help="replay responses from this JSON lines file")
+    parser.add_argument("--record", help="append rule-based responses to this JSON lines file")
+    parser.add_argument("--strict", action="store_true", help="return 404 for requests missing from the cassette")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of requests delayed by --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=1.0, help="delay of slow requests in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 503")
+    args = parser.parse_args()
+
+    server = StubOpenAIServer(args.host, args.port, args.latency, args.jitter, args.cassette, args.record, args.strict,
+                              slow_rate=args.slow_rate, slow_latency=args.slow_latency, error_rate=args.error_rate)
+    print(f"Stub OpenAI server listening on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,107 @@
+import json
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from models import TodoCreate
+from sessions import SessionManager
+
+NDJSON = "application/x-ndjson"
+
+# Import lines added per session lock acquisition, chat messages can run in between
+IMPORT_BATCH = int(os.getenv("TODO_IMPORT_BATCH", "1000"))
+# Todos serialized per session lock acquisition while exporting
+EXPORT_PAGE = 1000
+# Invalid lines reported back by an import, the rest are only counted
+MAX_REPORTED_ERRORS = 20
+# Longest import line in bytes, a body without newlines is never buffered whole
+MAX_LINE_BYTES = int(os.getenv("TODO_IMPORT_MAX_LINE_BYTES", str(64 * 1024)))
+
+
+async def ndjson_lines(chunks: AsyncIterator[bytes],
+                       max_line: int = None) -> AsyncIterator[Tuple[int, Optional[bytes]]]:
+    """
+    Non-blank lines of a streamed body with their 1-based line numbers.
+    Lines longer than max_line bytes come back as None, dropped as they arrive.
+    """
+    if max_line is None:
+        max_line = MAX_LINE_BYTES
+    pending = b""
+    # Whether pending continues a line that was already too long
+    too_long = False
+    number = 0
+    async for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        # The last piece may be cut off mid-line
+        pending = lines.pop()
+        for line in lines:
+            number += 1
+            if too_long or len(line) > max_line:
+                too_long = False
+                yield number, None
+            elif line.strip():
+                yield number, line
+        if len(pending) > max_line:
+            too_long = True
+            pending = b""
+    if too_long or len(pending) > max_line:
+        yield number + 1, None
+    elif pending.strip():
+        yield number + 1, pending
+
+
+async def import_ndjson(sessions: SessionManager, session_id: Optional[str],
+                        chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+    """
+    Add the TodoCreate objects of an NDJSON body to a session's list.
+
+    The body is read as it arrives and added in batches of IMPORT_BATCH, so
+    memory stays flat however large the import. Texts are cleaned like chat
+    adds and duplicates skipped. Returns counts and the first invalid lines.
+    """
+    result = {"added": 0, "skipped": 0, "invalid": 0, "errors": []}
+    batch: List[str] = []
+
+    async def flush():
+        async with sessions.session(session_id) as agent:
+            added, skipped = agent.import_todos(batch)
+        result["added"] += added
+        result["skipped"] += skipped
+        batch.clear()
+
+    def reject(number: int, error: str):
+        result["invalid"] += 1
+        if len(result["errors"]) < MAX_REPORTED_ERRORS:
+            result["errors"].append({"line": number, "error": error})
+
+    async for number, line in ndjson_lines(chunks):
+        if line is None:
+            reject(number, f"Line is longer than {MAX_LINE_BYTES} bytes")
+            continue
+        try:
+            batch.append(TodoCreate.model_validate_json(line).text)
+        except ValidationError as e:
+            reject(number, e.errors(include_url=False)[0]["msg"])
+            continue
+        if len(batch) >= IMPORT_BATCH:
+            await flush()
+    if batch:
+        await flush()
+    return result
+
+
+async def export_ndjson(sessions: SessionManager, session_id: Optional[str]) -> AsyncIterator[bytes]:
+    """
+    A session's todos as NDJSON in TodoResponse's JSON form, one page at a
+    time, so the whole list is never serialized at once.
+    """
+    cursor = None
+    while True:
+        async with sessions.session(session_id) as agent:
+            todos, cursor = agent.get_todos_page(cursor, EXPORT_PAGE)
+        if todos:
+            # TodoRecord.to_dict is TodoResponse's JSON form without building the models
+            yield "".join(json.dumps(todo.to_dict(), ensure_ascii=False) + "\n" for todo in todos).encode("utf-8")
+        if cursor is None:
+            return
@@ -0,0 +1,112 @@
+import re
+from typing import Dict, List, Tuple
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+# Small bundled lexicon for category queries like "remove grocery items". Only nouns, a verb like
+# "call", "run" or "email" says what to do and not what the todo is about ("Call dentist" is health)
+CATEGORIES: Dict[str, Tuple[str, ...]] = {
+    "groceries": (
+        "milk", "eggs", "egg", "bread", "butter", "cheese", "yogurt", "cream", "flour", "sugar", "salt", "rice",
+        "pasta", "cereal", "coffee", "tea", "juice", "apple", "banana", "mango", "orange", "lemon",
+        "grape", "berry", "strawberry", "tomato", "potato", "onion", "garlic", "carrot", "lettuce", "spinach",
+        "vegetable", "veggie", "fruit", "meat", "chicken", "beef", "pork", "fish", "salmon", "tuna", "ham",
+        "bacon", "sausage", "oil", "vinegar", "honey", "jam", "peanut", "nut", "snack", "chip", "cookie",
+        "chocolate", "soda", "beer", "wine", "grocery", "groceries", "avocado", "cucumber", "pepper", "bean",
+    ),
+    "party": (
+        "party", "birthday", "cake", "balloon", "decoration", "invitation", "guest", "gift", "candle", "napkin",
+        "plate", "cup", "confetti", "streamer", "dj", "playlist", "music", "venue", "celebration", "bbq",
+        "barbecue", "costume", "pinata",
+    ),
+    "work": (
+        "meeting", "report", "presentation", "client", "deadline", "project", "boss",
+        "colleague", "office", "slides", "proposal", "contract", "standup", "interview", "spreadsheet",
+        "budget", "quarterly", "invoice", "memo",
+    ),
+    "health": (
+        "dentist", "doctor", "appointment", "checkup", "pharmacy", "prescription", "medicine", "vitamin", "gym",
+        "workout", "therapy", "physio", "vaccine", "clinic", "hospital", "optician", "yoga",
+    ),
+    "chores": (
+        "laundry", "dishes", "trash", "garbage", "recycling", "garden", "lawn", "plumber", "bathroom", "kitchen",
+        "chores",
+    ),
+    "travel": (
+        "flight", "hotel", "passport", "visa", "luggage", "suitcase", "ticket", "train", "airport",
+        "booking", "trip", "vacation", "holiday", "rental", "itinerary",
+    ),
+    "bills": (
+        "bill", "rent", "mortgage", "tax", "taxes", "bank", "insurance", "electricity", "utility",
+        "subscription", "loan", "credit", "invoice",
+    ),
+    "family": (
+        "mom", "dad", "mother", "father", "grandma", "grandpa", "sister", "brother", "aunt", "uncle", "family",
+        "parents", "kids",
+    ),
+}
+
+# Words in a query that name a category. Words that are also todos ("meeting", "call")
+# are left out, "remove meeting" should delete a meeting and not all work todos
+CATEGORY_ALIASES: Dict[str, str] = {
+    "grocery": "groceries", "groceries": "groceries", "shopping": "groceries", "food": "groceries",
+    "supermarket": "groceries", "party": "party", "celebration": "party",
+    "work": "work", "job": "work", "office": "work",
+    "health": "health", "medical": "health",
+    "chores": "chores", "chore": "chores", "housework": "chores", "cleaning": "chores", "household": "chores",
+    "travel": "travel",
+    "bills": "bills", "bill": "bills", "finance": "bills", "money": "bills", "payments": "bills",
+    "family": "family", "relatives": "family",
+}
+
+# Query words that don't narrow anything down, "remove party stuff" names the category only
+FILLER_WORDS = frozenset({
+    "the", "my", "all", "a", "an", "any", "of", "for", "to", "related", "stuff", "things", "thing", "items",
+    "item", "todos", "todo", "tasks", "task", "list", "everything", "every", "some", "do", "i", "have",
+    "what", "which", "show", "me", "and", "or",
+})
+
+CATEGORY_BITS: Dict[str, int] = {name: 1 << index for index, name in enumerate(CATEGORIES)}
+
+
+def _stem(word: str) -> str:
+    """Crude plural folding, enough for the lexicon ("tomatoes" -> "tomato")"""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("oes", "ches", "shes", "xes", "sses")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+_WORD_BITS: Dict[str, int] = {}
+for _name, _words in CATEGORIES.items():
+    for _word in _words:
+        for _form in {_word, _stem(_word)}:
+            _WORD_BITS[_form] = _WORD_BITS.get(_form, 0) | CATEGORY_BITS[_name]
+
+
+def words(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def categories_of(text: str) -> int:
+    """Bitmask of the categories the text's words belong to"""
+    mask = 0
+    for word in words(text):
+        mask |= _WORD_BITS.get(word, 0) | _WORD_BITS.get(_stem(word), 0)
+    return mask
+
+
+def category_query(query: str) -> int:
+    """Category bitmask when the query only names categories ("grocery items"), otherwise 0"""
+    mask = 0
+    for word in words(query):
+        if word in FILLER_WORDS:
+            continue
+        name = CATEGORY_ALIASES.get(word) or CATEGORY_ALIASES.get(_stem(word))
+        if name is None:
+            return 0
+        mask |= CATEGORY_BITS[name]
+    return mask
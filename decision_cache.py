@@ -0,0 +1,230 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from metrics import REGISTRY
+
+# A cached decision: the tool calls the model made, as (name, arguments) pairs
+Decision = List[Tuple[str, Dict[str, Any]]]
+
+# Decisions larger than this are not worth keeping, e.g. a pasted shopping list
+MAX_DECISION_BYTES = 2048
+
+CACHE_EVENTS = REGISTRY.counter(
+    "todo_decision_cache_events_total",
+    "Decision cache lookups and evictions, by event (hit, miss, store, eviction)",
+    ["event"],
+)
+
+
+def normalize_message(message: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return " ".join(message.lower().split()).rstrip(".!?")
+
+
+class DecisionCacheBackend:
+    """Where cached decisions are kept, as serialized JSON strings"""
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    @property
+    def evictions(self) -> int:
+        return 0
+
+
+class InMemoryDecisionCache(DecisionCacheBackend):
+    """Per-process LRU bounded by entry count and total size, entries expire after ttl seconds"""
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 8 * 1024 * 1024, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # Key -> (expiry time, value), least recently used first
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._bytes = 0
+        self._evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _size(key: str, value: str) -> int:
+        return len(key) + len(value)
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < now:
+                del self._entries[key]
+                self._bytes -= self._size(key, value)
+                self._evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= self._size(key, old[1])
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._bytes += self._size(key, value)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                old_key, (_, old_value) = self._entries.popitem(last=False)
+                self._bytes -= self._size(old_key, old_value)
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    @property
+    def evictions(self) -> int:
+        return self._evictions
+
+
+class RedisDecisionCache(DecisionCacheBackend):
+    """Shared between workers through Redis, which handles expiry and eviction itself"""
+
+    def __init__(self, url: str, ttl: float = 3600, prefix: str = "todo:decision:"):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("RedisDecisionCache needs the redis package: pip install redis")
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[str]:
+        return self._redis.get(self.prefix + key)
+
+    def set(self, key: str, value: str):
+        self._redis.set(self.prefix + key, value, ex=self.ttl)
+
+    def clear(self):
+        for key in self._redis.scan_iter(match=self.prefix + "*"):
+            self._redis.delete(key)
+
+
+class DecisionCache:
+    """
+    Maps (normalized message, session state fingerprint) to the model's tool calls.
+
+    Only decisions made purely of tool calls are cached, and the fingerprint
+    covers what the decision depends on: the prompt in use, the todo list
+    and, when the previous reply asked the user something, that question.
+    Earlier turns are left out, so messages that stand on their own hit
+    across sessions and conversations. A hit lets the agent run the tools
+    without calling the model.
+    """
+
+    def __init__(self, backend: DecisionCacheBackend = None):
+        # Not `backend or ...`, an empty in-memory backend has length 0
+        self.backend = backend if backend is not None else InMemoryDecisionCache()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self._evictions_seen = 0
+
+    @staticmethod
+    def key(message: str, fingerprint: str) -> str:
+        raw = f"{fingerprint}\n{normalize_message(message)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _count(self, event: str, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+        CACHE_EVENTS.inc(event=event)
+
+    def get(self, key: str) -> Optional[Decision]:
+        try:
+            raw = self.backend.get(key)
+        except Exception:
+            # A shared backend being down only costs a model call
+            raw = None
+        if raw is None:
+            self._count("miss", "misses")
+            return None
+        self._count("hit", "hits")
+        return [(name, args) for name, args in json.loads(raw)]
+
+    def put(self, key: str, decision: Decision):
+        raw = json.dumps(decision, separators=(",", ":"))
+        if len(raw) > MAX_DECISION_BYTES:
+            return
+        try:
+            self.backend.set(key, raw)
+        except Exception:
+            return
+        self._count("store", "stores")
+        self._sync_evictions()
+
+    def _sync_evictions(self):
+        evictions = self.backend.evictions
+        with self._lock:
+            new = evictions - self._evictions_seen
+            self._evictions_seen = evictions
+        if new > 0:
+            CACHE_EVENTS.inc(new, event="eviction")
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        self._sync_evictions()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self._evictions_seen,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_shared_cache: Optional[DecisionCache] = None
+_shared_lock = threading.Lock()
+
+
+def shared_decision_cache() -> Optional[DecisionCache]:
+    """
+    The process-wide cache configured from the environment, None when disabled.
+
+    TODO_DECISION_CACHE=0 turns it off. TODO_DECISION_CACHE_URL points at a
+    Redis server shared by all workers, otherwise an in-process LRU holding
+    TODO_DECISION_CACHE_SIZE entries is used. Entries live for
+    TODO_DECISION_CACHE_TTL seconds.
+    """
+    global _shared_cache
+    if os.getenv("TODO_DECISION_CACHE", "1") == "0":
+        return None
+    with _shared_lock:
+        if _shared_cache is None:
+            ttl = float(os.getenv("TODO_DECISION_CACHE_TTL", "3600"))
+            url = os.getenv("TODO_DECISION_CACHE_URL")
+            if url:
+                backend = RedisDecisionCache(url, ttl=ttl)
+            else:
+                size = int(os.getenv("TODO_DECISION_CACHE_SIZE", "10000"))
+                backend = InMemoryDecisionCache(max_entries=size, ttl=ttl)
+            _shared_cache = DecisionCache(backend)
+        return _shared_cache
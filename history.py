@@ -0,0 +1,121 @@
+import os
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional
+
+# Rough size of the per-message wrapping the API adds around content
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate, about four characters per token for English text"""
+    return len(text) // 4 + 1
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= max_chars else text[:max_chars - 3].rstrip() + "..."
+
+
+class ConversationHistory:
+    """
+    Server-side conversation history kept within a token budget.
+
+    Recent turns are sent verbatim. When they exceed the budget the oldest
+    turns are folded into a short running summary, itself bounded, and every
+    prompt also carries a compact snapshot of the current todo list. The
+    context sent per turn therefore stays bounded however long the
+    conversation runs.
+    """
+
+    def __init__(self, budget_tokens: int = None, summary_tokens: int = None,
+                 max_turn_chars: int = 500, snapshot_items: int = 30):
+        if budget_tokens is None:
+            budget_tokens = int(os.getenv("TODO_HISTORY_TOKENS", "600"))
+        if summary_tokens is None:
+            summary_tokens = int(os.getenv("TODO_SUMMARY_TOKENS", "200"))
+        self.budget_tokens = budget_tokens
+        self.summary_tokens = summary_tokens
+        self.max_turn_chars = max_turn_chars
+        self.snapshot_items = snapshot_items
+        # Verbatim turns: (role, content, estimated tokens)
+        self.turns: deque = deque()
+        self.turn_tokens = 0
+        # One line per compacted exchange, oldest first
+        self.summary: deque = deque()
+        self.summary_token_count = 0
+
+    def __len__(self) -> int:
+        return len(self.turns)
+
+    def record(self, user_message: str, assistant_reply: Optional[str]):
+        """Add one exchange and compact older turns if over budget"""
+        self._append("user", user_message)
+        if assistant_reply:
+            self._append("assistant", assistant_reply)
+        self._compact()
+
+    def _append(self, role: str, content: str):
+        content = _truncate(content, self.max_turn_chars)
+        tokens = estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+        self.turns.append((role, content, tokens))
+        self.turn_tokens += tokens
+
+    def _compact(self):
+        """Fold the oldest turns into the summary until the verbatim turns fit"""
+        # Always keep the latest exchange verbatim for follow-ups like "also eggs"
+        while self.turn_tokens > self.budget_tokens and len(self.turns) > 2:
+            role, content, tokens = self.turns.popleft()
+            self.turn_tokens -= tokens
+            line = f"{role}: {_truncate(content, 80)}"
+            self.summary.append(line)
+            self.summary_token_count += estimate_tokens(line)
+
+        # The todo snapshot carries the current state, so old summary lines can go
+        while self.summary_token_count > self.summary_tokens and self.summary:
+            self.summary_token_count -= estimate_tokens(self.summary.popleft())
+
+    def clear(self):
+        self.turns.clear()
+        self.turn_tokens = 0
+        self.summary.clear()
+        self.summary_token_count = 0
+
+    def snapshot(self, todo_texts: Iterable[str]) -> str:
+        """Compact view of the todo list, capped at snapshot_items entries"""
+        texts = list(todo_texts)
+        if not texts:
+            return "Current todo list: empty."
+        shown = "; ".join(_truncate(text, 60) for text in texts[:self.snapshot_items])
+        more = f"; and {len(texts) - self.snapshot_items} more" if len(texts) > self.snapshot_items else ""
+        return f"Current todo list ({len(texts)}): {shown}{more}."
+
+    def messages(self, todo_texts: Iterable[str]) -> List[Dict[str, str]]:
+        """Context messages to place between the system prompt and the new user message"""
+        context = self.snapshot(todo_texts)
+        if self.summary:
+            context = "Earlier in this conversation:\n" + "\n".join(self.summary) + "\n" + context
+        messages = [{"role": "system", "content": context}]
+        messages.extend({"role": role, "content": content} for role, content, _ in self.turns)
+        return messages
+
+    def open_question(self) -> str:
+        """The last reply when it asked the user something, a "yes" next only makes sense with it, else """""
+        if not self.turns:
+            return ""
+        role, content, _ = self.turns[-1]
+        return content if role == "assistant" and content.rstrip().endswith("?") else ""
+
+    def export_state(self) -> Dict[str, Any]:
+        return {
+            "turns": [[role, content] for role, content, _ in self.turns],
+            "summary": list(self.summary),
+        }
+
+    def load_state(self, state: Dict[str, Any]):
+        self.clear()
+        for role, content in state.get("turns", []):
+            self._append(role, content)
+        for line in state.get("summary", []):
+            self.summary.append(line)
+            self.summary_token_count += estimate_tokens(line)
+        self._compact()
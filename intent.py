@@ -0,0 +1,206 @@
+import re
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from metrics import REGISTRY
+from normalize import starts_with_action
+from categories import category_query
+
+# Phrases that ask to see the whole list
+LIST_PATTERN = re.compile(
+    r"^(?:please\s+)?(?:"
+    r"(?:show|display|list|view|see|print|give)(?:\s+me)?(?:\s+(?:my|the|all|all\s+my))?"
+    r"(?:\s+(?:todo|to-do|to\s+do))?\s+(?:list|todos|tasks|items)"
+    r"|what(?:'s|\s+is)\s+on\s+(?:my|the)\s+(?:todo\s+)?list"
+    r"|what(?:'s|\s+is)\s+left(?:\s+to\s+do)?"
+    r"|(?:my\s+)?(?:todo\s+)?list|todos|tasks"
+    r")$"
+)
+
+# Requests to see part of the list, the captured group names what to show ("grocery items")
+FILTERED_LIST_PATTERN = re.compile(
+    r"^(?:please\s+)?(?:show|display|list|view|see|give)(?:\s+me)?(?:\s+(?:my|the|all|all\s+my))?\s+(.+?)"
+    r"(?:\s+(?:on|in|from)\s+(?:my|the)\s+(?:todo\s+)?list)?$"
+)
+
+# Explicit add requests, the captured group is the todo text
+ADD_PATTERN = re.compile(
+    r"^(?:please\s+)?(?:"
+    r"add|"
+    r"i\s+(?:need|have|want)\s+to|i\s+(?:should|must)|"
+    r"remind\s+me\s+to|don't\s+forget\s+to|do\s+not\s+forget\s+to"
+    r")\s+(.+?)(?:\s+to\s+(?:my|the)\s+(?:todo\s+)?list)?$"
+)
+
+# Explicit delete requests, the captured group is the text to match
+DELETE_PATTERN = re.compile(
+    r"^(?:please\s+)?(?:remove|delete|cross\s+off|scratch)\s+(?:the\s+)?(.+?)"
+    r"(?:\s+from\s+(?:my|the)\s+(?:todo\s+)?list)?$"
+)
+
+# Separators between items in "milk, bread and eggs"
+SPLIT_PATTERN = re.compile(r"\s*(?:,|&|\band\b)\s*")
+
+# Words that mean the message depends on context or spans several items
+AMBIGUOUS_WORDS = {
+    'and', 'also', 'too', 'it', 'that', 'this', 'them', 'those', 'these',
+    'all', 'everything', 'stuff', 'things', 'items', 'related', 'or',
+}
+
+class Intent(NamedTuple):
+    name: str
+    text: Optional[str] = None
+
+    def tool_call(self) -> Tuple[str, Dict[str, str]]:
+        """(function name, arguments) as the model would have called the tool"""
+        if self.text is None:
+            return self.name, {}
+        return self.name, {"query" if self.name == "list_todos" else "text": self.text}
+
+
+FAST_PATH_LOCAL = REGISTRY.counter("todo_fast_path_local_total", "Messages answered without calling the model")
+FAST_PATH_REMOTE = REGISTRY.counter("todo_fast_path_remote_total", "Messages that needed the model")
+
+
+class FastPathStats:
+    """Counts how many messages were answered without calling the model, also exported as counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.local = 0
+        self.remote = 0
+
+    def record(self, handled_locally: bool):
+        with self._lock:
+            if handled_locally:
+                self.local += 1
+            else:
+                self.remote += 1
+        (FAST_PATH_LOCAL if handled_locally else FAST_PATH_REMOTE).inc()
+
+    @property
+    def total(self) -> int:
+        return self.local + self.remote
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.total
+        return self.local / total if total else 0.0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            local, remote = self.local, self.remote
+        total = local + remote
+        return {
+            "local": local,
+            "remote": remote,
+            "total": total,
+            "hit_rate": local / total if total else 0.0,
+        }
+
+    def reset(self):
+        """Start the hit rate over, the exported counters keep counting"""
+        with self._lock:
+            self.local = 0
+            self.remote = 0
+
+
+# Shared by every agent so the hit rate covers all traffic
+fast_path_stats = FastPathStats()
+
+REGISTRY.gauge("todo_fast_path_hit_ratio", "Share of messages answered without calling the model",
+               lambda: fast_path_stats.hit_rate)
+
+
+def _normalize(message: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return " ".join(message.lower().split()).rstrip(" .!?")
+
+
+def _is_ambiguous(text: str) -> bool:
+    """Check for commas or words that the model should interpret"""
+    if ',' in text or '&' in text:
+        return True
+    return any(word in AMBIGUOUS_WORDS for word in text.split())
+
+
+def _names_categories(text: str, agent) -> bool:
+    """Whether text only names categories and some todos are in them"""
+    if not category_query(text):
+        return False
+    kind, ids = agent.storage.match(text)
+    return kind == "category" and bool(ids)
+
+
+def classify_intent(message: str, agent) -> Optional[Intent]:
+    """
+    Classify a message as an unambiguous add, delete or list request.
+
+    Returns None whenever the message needs the model, e.g. multiple items,
+    context-dependent phrasing or adds without an action verb. Deletes and
+    filtered lists that only name categories ("remove party stuff") are
+    handled locally when the category lexicon finds todos for them.
+    """
+    text = _normalize(message)
+    if not text:
+        return None
+
+    if LIST_PATTERN.match(text):
+        return Intent("list_todos")
+
+    match = FILTERED_LIST_PATTERN.match(text)
+    if match and _names_categories(match.group(1), agent):
+        return Intent("list_todos", match.group(1))
+
+    # Questions are left to the model
+    if '?' in text:
+        return None
+
+    match = ADD_PATTERN.match(text)
+    if match:
+        item = match.group(1)
+        if _is_ambiguous(item):
+            return None
+        cleaned = agent._extract_action_and_item(item)
+        # Without an action verb the model would infer one ("mango" -> "buy mango")
+        if not starts_with_action(cleaned):
+            return None
+        return Intent("add_todo", item)
+
+    match = DELETE_PATTERN.match(text)
+    if match:
+        item = match.group(1)
+        if _names_categories(item, agent):
+            return Intent("delete_todo", item)
+        if _is_ambiguous(item):
+            return None
+        # Only delete locally when the literal text matches something,
+        # otherwise the model may resolve it by category or synonym
+        if not agent.find_matching_ids(item):
+            return None
+        return Intent("delete_todo", item)
+
+    return None
+
+
+def fallback_intents(message: str, agent) -> List[Intent]:
+    """
+    Deterministic reading of a message for when the model is unavailable.
+
+    Tries classify_intent first, then accepts what it would leave to the model:
+    deletes without a literal match, adds without an action verb and comma or
+    "and" separated lists. Returns [] for anything else, e.g. questions.
+    """
+    intent = classify_intent(message, agent)
+    if intent is not None:
+        return [intent]
+
+    text = _normalize(message)
+    if '?' in text or not text:
+        return []
+    for pattern, name in ((DELETE_PATTERN, "delete_todo"), (ADD_PATTERN, "add_todo")):
+        match = pattern.match(text)
+        if match:
+            items = [item.strip() for item in SPLIT_PATTERN.split(match.group(1))]
+            return [Intent(name, item) for item in items if item]
+    return []
@@ -0,0 +1,401 @@
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from models import TodoId, TodoRecord
+from sessions import SessionStore
+
+_SEGMENT_RE = re.compile(r"^journal-(\d{8})\.log$")
+SNAPSHOT_FILE = "snapshot.jsonl"
+
+
+def _segment_name(number: int) -> str:
+    return f"journal-{number:08d}.log"
+
+
+class Journal:
+    """
+    Append-only log of JSON records split into numbered segment files.
+
+    Appends only buffer the encoded line, a writer thread writes whatever has
+    accumulated every commit_interval seconds and fsyncs it once (group
+    commit). Callers that need durability wait for their sequence number to
+    be committed, sharing the fsync with every other write in the batch.
+    """
+
+    def __init__(self, directory: str, commit_interval: float = 0.002, fsync: bool = True, first_segment: int = 0):
+        self.directory = directory
+        self.commit_interval = commit_interval
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+
+        # Never append after a possibly torn last line, start a fresh segment. Numbers a snapshot
+        # already covers (below first_segment) aren't reused, their records would be skipped
+        existing = self.segments(directory)
+        self.segment = max(existing[-1] + 1 if existing else 0, first_segment)
+        self._file = open(os.path.join(directory, _segment_name(self.segment)), "a", encoding="utf-8")
+
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._buffer: List[str] = []
+        self._seq = 0
+        self._committed = 0
+        self._closed = False
+        self._writer = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+        self._writer.start()
+
+    @staticmethod
+    def segments(directory: str) -> List[int]:
+        """Segment numbers present in directory, oldest first"""
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return []
+        return sorted(int(match.group(1)) for match in map(_SEGMENT_RE.match, names) if match)
+
+    @classmethod
+    def read(cls, directory: str, first_segment: int = 0) -> Iterator[list]:
+        """Records from first_segment on, stopping each segment at a torn or partial line"""
+        for number in cls.segments(directory):
+            if number < first_segment:
+                continue
+            with open(os.path.join(directory, _segment_name(number)), "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    yield record
+
+    def append(self, record: list) -> int:
+        """Queue a record for the next group commit and return its sequence number"""
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Journal is closed")
+            self._seq += 1
+            self._buffer.append(line)
+            self._cond.notify_all()
+            return self._seq
+
+    def wait(self, seq: int):
+        """Block until the record with this sequence number is on disk"""
+        with self._cond:
+            while self._committed < seq and not self._closed:
+                self._cond.wait()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._buffer and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+            # Let concurrent writers join this batch
+            time.sleep(self.commit_interval)
+            with self._io_lock:
+                self._commit()
+
+    def _commit(self):
+        """Write and fsync the buffered records, caller holds _io_lock"""
+        with self._cond:
+            lines, self._buffer = self._buffer, []
+            seq = self._seq
+        if lines:
+            self._file.write("".join(lines))
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+        with self._cond:
+            self._committed = max(self._committed, seq)
+            self._cond.notify_all()
+
+    def rotate(self) -> int:
+        """Commit pending records and start a new segment, returns its number"""
+        with self._io_lock:
+            self._commit()
+            self._file.close()
+            self.segment += 1
+            self._file = open(os.path.join(self.directory, _segment_name(self.segment)), "a", encoding="utf-8")
+            return self.segment
+
+    def drop_segments(self, before: int):
+        """Delete segments older than before, once a snapshot covers them"""
+        for number in self.segments(self.directory):
+            if number < before:
+                os.remove(os.path.join(self.directory, _segment_name(number)))
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._writer.join()
+        with self._io_lock:
+            self._commit()
+            self._file.close()
+
+
+class SessionJournal:
+    """A session's view of the journal, called by TodoAgent on every todo change"""
+
+    __slots__ = ("store", "session_id")
+
+    def __init__(self, store: "JournalSessionStore", session_id: str):
+        self.store = store
+        self.session_id = session_id
+
+    def added(self, todo: TodoRecord):
+        self.store.apply(["a", self.session_id, todo.id_str, todo.text, todo.created_at, todo.completed])
+
+    def deleted(self, todo_id: TodoId):
+        self.store.apply(["d", self.session_id, TodoRecord.format_id(todo_id)])
+
+    def cleared(self):
+        self.store.apply(["c", self.session_id])
+
+
+def _replay(entry: Optional[Dict[str, Any]], records: List[list]) -> Optional[Dict[str, Any]]:
+    """A session's snapshot entry with records applied, None once it holds nothing"""
+    todos = {todo[0]: todo for todo in entry["todos"]} if entry else {}
+    meta = entry.get("meta") if entry else None
+    for record in records:
+        op = record[0]
+        if op == "a":
+            todos[record[2]] = record[2:6]
+        elif op == "d":
+            todos.pop(record[2], None)
+        elif op == "c":
+            todos.clear()
+        elif op == "m":
+            meta = record[2]
+        elif op == "x":
+            todos.clear()
+            meta = None
+    if not todos and meta is None:
+        return None
+    merged = {"todos": list(todos.values())}
+    if meta:
+        merged["meta"] = meta
+    return merged
+
+
+class _Snapshot:
+    """
+    A snapshot file: a {"segment": n} header line, then one [session id,
+    entry] line per session. Only where each line is gets kept in memory,
+    and the file stays open while anything reads it, even once replaced.
+    """
+
+    def __init__(self, path: Optional[str] = None, segment: int = 0,
+                 lines: Optional[Dict[str, Tuple[int, int]]] = None, todos: int = 0):
+        self.segment = segment
+        # Session id -> (offset, length) of its line
+        self.lines = lines or {}
+        self.todos = todos
+        self._fd = os.open(path, os.O_RDONLY) if path else None
+
+    @classmethod
+    def load(cls, path: str) -> "_Snapshot":
+        if not os.path.exists(path):
+            return cls()
+        lines, todos, offset = {}, 0, 0
+        with open(path, "rb") as f:
+            header = f.readline()
+            segment = json.loads(header)["segment"]
+            offset += len(header)
+            for line in f:
+                session_id, entry = json.loads(line)
+                lines[session_id] = (offset, len(line))
+                todos += len(entry["todos"])
+                offset += len(line)
+        return cls(path, segment, lines, todos)
+
+    @classmethod
+    def write(cls, path: str, segment: int, sessions: Iterator[Tuple[str, Dict[str, Any]]]) -> "_Snapshot":
+        """Write sessions to path atomically and return the new snapshot"""
+        tmp_path = f"{path}.tmp"
+        lines, todos = {}, 0
+        with open(tmp_path, "wb") as f:
+            offset = f.write(json.dumps({"segment": segment}).encode("utf-8") + b"\n")
+            for session_id, entry in sessions:
+                line = json.dumps([session_id, entry], ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                length = f.write(line + b"\n")
+                lines[session_id] = (offset, length)
+                todos += len(entry["todos"])
+                offset += length
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return cls(path, segment, lines, todos)
+
+    def read(self, session_id: str) -> Optional[Dict[str, Any]]:
+        position = self.lines.get(session_id)
+        if position is None:
+            return None
+        offset, length = position
+        return json.loads(os.pread(self._fd, length, offset))[1]
+
+    def merged(self, changes: Dict[str, List[list]]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Every session with its changes applied, one at a time"""
+        for session_id in self.lines:
+            entry = self.read(session_id)
+            if session_id in changes:
+                entry = _replay(entry, changes[session_id])
+            if entry is not None:
+                yield session_id, entry
+        for session_id, records in changes.items():
+            if session_id not in self.lines:
+                entry = _replay(None, records)
+                if entry is not None:
+                    yield session_id, entry
+
+    def __del__(self):
+        if self._fd is not None:
+            os.close(self._fd)
+
+
+class JournalSessionStore(SessionStore):
+    """
+    Durable session store backed by a Journal and periodic snapshots.
+
+    Todo changes are journaled as they happen, so a write costs one buffered
+    append instead of re-serializing the list. Other session state (pending
+    confirmation, conversation history) is journaled when the session is
+    spilled. Only the records since the last snapshot are kept in memory, a
+    session is loaded from its snapshot line plus those. Every
+    snapshot_every records a background thread merges the snapshot with the
+    sealed segments into a new one and drops them, so memory stays bounded
+    and recovery is a snapshot scan plus a short replay.
+    """
+
+    def __init__(self, directory: str, snapshot_every: int = None, commit_interval: float = None,
+                 fsync: bool = None, durable_writes: bool = None):
+        if snapshot_every is None:
+            snapshot_every = int(os.getenv("TODO_JOURNAL_SNAPSHOT_EVERY", "100000"))
+        if commit_interval is None:
+            commit_interval = float(os.getenv("TODO_JOURNAL_COMMIT_INTERVAL", "0.002"))
+        if fsync is None:
+            fsync = os.getenv("TODO_JOURNAL_FSYNC", "1") != "0"
+        if durable_writes is None:
+            durable_writes = os.getenv("TODO_JOURNAL_DURABLE_WRITES", "0") == "1"
+
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        # Wait for the group commit on every change instead of returning once buffered
+        self.durable_writes = durable_writes
+        self._lock = threading.Lock()
+        # One snapshot at a time, whether from the background thread or a direct call
+        self._snapshot_lock = threading.Lock()
+        # Segment -> session id -> records journaled there since the snapshot was taken
+        self._tail: Dict[int, Dict[str, List[list]]] = {}
+
+        os.makedirs(directory, exist_ok=True)
+        self.recovered = self._recover()
+        self.journal = Journal(directory, commit_interval=commit_interval, fsync=fsync,
+                               first_segment=self._snapshot.segment)
+        self._ops_since_snapshot = self.recovered["replayed"]
+        self._snapshot_thread: Optional[threading.Thread] = None
+
+    def _recover(self) -> Dict[str, int]:
+        """Index the latest snapshot and read the journal written after it"""
+        self._snapshot = _Snapshot.load(os.path.join(self.directory, SNAPSHOT_FILE))
+        # Older than any segment the journal writes to from here on, so the next snapshot covers them
+        recovered = self._tail[self._snapshot.segment] = {}
+        replayed = 0
+        for record in Journal.read(self.directory, self._snapshot.segment):
+            recovered.setdefault(record[1], []).append(record)
+            replayed += 1
+        return {"snapshot_todos": self._snapshot.todos, "replayed": replayed}
+
+    def apply(self, record: list):
+        """Record a change in the journal"""
+        with self._lock:
+            seq = self.journal.append(record)
+            # rotate() also runs under _lock, so this is the segment the record lands in
+            self._tail.setdefault(self.journal.segment, {}).setdefault(record[1], []).append(record)
+            self._ops_since_snapshot += 1
+            if self._ops_since_snapshot >= self.snapshot_every and self._snapshot_thread is None:
+                self._snapshot_thread = threading.Thread(target=self._background_snapshot, daemon=True)
+                self._snapshot_thread.start()
+        if self.durable_writes:
+            self.journal.wait(seq)
+
+    def journal_for(self, session_id: str) -> SessionJournal:
+        return SessionJournal(self, session_id)
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            snapshot = self._snapshot
+            records = [record for sessions in self._tail.values() for record in sessions.get(session_id, ())]
+        entry = _replay(snapshot.read(session_id), records)
+        if entry is None:
+            return None
+        state = dict(entry.get("meta") or {})
+        state["todos"] = [
+            {"id": todo_id, "text": text, "created_at": datetime.fromtimestamp(created_at).isoformat(),
+             "completed": completed}
+            for todo_id, text, created_at, completed in entry["todos"]
+        ]
+        return state
+
+    def save(self, session_id: str, state: Dict[str, Any]):
+        # Todos are already journaled change by change, only the rest is recorded here
+        self.apply(["m", session_id, {key: value for key, value in state.items() if key != "todos"}])
+
+    def delete(self, session_id: str):
+        self.apply(["x", session_id])
+
+    def _background_snapshot(self):
+        try:
+            self.snapshot()
+        finally:
+            with self._lock:
+                self._snapshot_thread = None
+
+    def snapshot(self):
+        """Merge the last snapshot with the segments written since into a new one and drop those segments"""
+        with self._snapshot_lock:
+            with self._lock:
+                # Records from here on go to the new segment, the ones before are sealed
+                segment = self.journal.rotate()
+                previous = self._snapshot
+                sealed = [sessions for number, sessions in self._tail.items() if number < segment]
+                self._ops_since_snapshot = 0
+
+            changes: Dict[str, List[list]] = {}
+            for sessions in sealed:
+                for session_id, records in sessions.items():
+                    changes.setdefault(session_id, []).extend(records)
+            path = os.path.join(self.directory, SNAPSHOT_FILE)
+            snapshot = _Snapshot.write(path, segment, previous.merged(changes))
+
+            with self._lock:
+                self._snapshot = snapshot
+                for number in [number for number in self._tail if number < segment]:
+                    del self._tail[number]
+            self.journal.drop_segments(segment)
+
+    def todo_count(self) -> int:
+        """Todos over every session, reads the whole snapshot so it is for diagnostics"""
+        with self._lock:
+            snapshot = self._snapshot
+            changes: Dict[str, List[list]] = {}
+            for sessions in self._tail.values():
+                for session_id, records in sessions.items():
+                    changes.setdefault(session_id, []).extend(records)
+        return sum(len(entry["todos"]) for _, entry in snapshot.merged(changes))
+
+    def close(self):
+        """Commit everything still buffered, e.g. on shutdown"""
+        thread = self._snapshot_thread
+        if thread is not None:
+            thread.join()
+        self.journal.close()
@@ -6,27 +6,103 @@ This follows the exact Bubbletea documentation pattern.
 The @bt.chatbot decorator automatically handles all the HTTP endpoint setup.
 """
 
-import bubbletea_chat as bt
-from todo_agent import TodoAgent
-import os
+# The only .env load, before the modules below read TODO_* settings at import
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Initialize the todo agent
-todo_agent = TodoAgent()
+import bubbletea_chat as bt
+from bubbletea_chat.server import BubbleTeaServer
+from fastapi import HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from bulk import NDJSON, export_ndjson, import_ndjson
+from models import TodoPage
+from sessions import SessionManager
+from scheduler import MessageScheduler
+from metrics import CONTENT_TYPE, REGISTRY, record_error, span
+import os
+import sys
+from typing import Optional
+
+# One todo agent per user, all sharing a single OpenAI client built on the first model call
+session_manager = SessionManager()
+REGISTRY.gauge("todo_sessions_resident", "User sessions currently held in memory", lambda: len(session_manager))
+
+# Per-session ordering, burst coalescing and the global model call budget
+scheduler = MessageScheduler(session_manager)
+REGISTRY.gauge("todo_queue_depth", "Messages queued in sessions, not picked up yet", scheduler.depth)
+REGISTRY.gauge("todo_llm_waiting", "Messages waiting for a model call slot", lambda: scheduler.waiting)
+REGISTRY.gauge("todo_llm_in_flight", "Model calls in progress", lambda: scheduler.in_flight)
+
+# Stream partial replies as they are generated (TODO_STREAMING=1)
+STREAMING = os.getenv("TODO_STREAMING", "0") == "1"
 
-@bt.chatbot
-def todo_agent_bot(message: str):
+PORT = int(os.getenv("TODO_PORT", "8000"))
+# Worker processes, more than one needs TODO_DATABASE so they share todos
+WORKERS = int(os.getenv("TODO_WORKERS", "1"))
+# Build the OpenAI clients in the background once the server is up (TODO_PREWARM=0 to wait for a model call)
+PREWARM = os.getenv("TODO_PREWARM", "1") == "1"
+
+@bt.chatbot(stream=STREAMING)
+async def todo_agent_bot(message: str, user_uuid: str = None, conversation_uuid: str = None):
     """
     AI Todo Agent chatbot that manages todos through natural language
     """
     try:
-        # Process the message through the AI agent
-        response = todo_agent.process_message(message, [])
-        return bt.Text(response)
+        with span("handler"):
+            # Each user gets their own list and history, messages within a session are handled in order
+            session_id = user_uuid or conversation_uuid
+            if STREAMING:
+                # Send text and tool results to the user as soon as they arrive
+                async for chunk in scheduler.stream(session_id, message):
+                    yield bt.Text(chunk)
+            else:
+                # Process the message through the AI agent without blocking the event loop
+                response = await scheduler.submit(session_id, message)
+                yield bt.Text(response)
     except Exception as e:
-        return bt.Text(f"Sorry, I encountered an error: {str(e)}")
+        record_error(e)
+        yield bt.Text(f"Sorry, I encountered an error: {str(e)}")
+
+async def metrics():
+    """Prometheus metrics for the chat path"""
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+async def import_todos(request: Request, user_uuid: Optional[str] = None, conversation_uuid: Optional[str] = None):
+    """Bulk add from an NDJSON body of TodoCreate objects, e.g. {"text": "buy milk"} per line"""
+    return await import_ndjson(session_manager, user_uuid or conversation_uuid, request.stream())
+
+async def export_todos(user_uuid: Optional[str] = None, conversation_uuid: Optional[str] = None):
+    """The whole list as streamed NDJSON, one TodoResponse per line"""
+    return StreamingResponse(export_ndjson(session_manager, user_uuid or conversation_uuid), media_type=NDJSON)
+
+async def list_todos(user_uuid: Optional[str] = None, conversation_uuid: Optional[str] = None,
+                     cursor: Optional[str] = None, limit: int = 100) -> TodoPage:
+    """One page of the list, follow next_cursor for the rest"""
+    async with session_manager.session(user_uuid or conversation_uuid) as agent:
+        try:
+            todos, next_cursor = agent.get_todos_page(cursor, min(max(limit, 1), 1000))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return TodoPage(todos=[todo.to_response() for todo in todos], next_cursor=next_cursor)
+
+def create_server(port: int = 8000) -> BubbleTeaServer:
+    """The Bubbletea server with the extra endpoints registered next to /chat"""
+    server = BubbleTeaServer(todo_agent_bot, port=port)
+    server.app.get("/metrics")(metrics)
+    server.app.post("/todos/import")(import_todos)
+    server.app.get("/todos/export")(export_todos)
+    server.app.get("/todos", response_model=TodoPage)(list_todos)
+    # Spill idle sessions on a timer, then every session and the journal before the process exits
+    server.app.router.on_startup.append(session_manager.start_sweeper)
+    server.app.router.on_shutdown.append(session_manager.close)
+    if PREWARM:
+        server.app.router.on_startup.append(session_manager.transport.warm_up)
+    return server
+
+# Module-level app so uvicorn workers can import it as "main:app"
+server = create_server(port=PORT)
+app = server.app
 
 if __name__ == "__main__":
     # Check if OpenAI API key is set
@@ -41,5 +117,17 @@ if __name__ == "__main__":
     print("The @bt.chatbot decorator automatically handles all the HTTP endpoint setup.")
     print()
     
-    # Creates /chat endpoint automatically
-    bt.run_server(todo_agent_bot, port=8000, host="0.0.0.0")
+    # Creates /chat endpoint automatically, plus /metrics
+    if WORKERS > 1:
+        if not os.getenv("TODO_DATABASE"):
+            print("Warning: TODO_WORKERS is set but TODO_DATABASE isn't, each worker would have its own lists!")
+            print("Set TODO_DATABASE to a SQLite file path to share todos between workers.")
+            exit(1)
+        # Hand over to the uvicorn CLI, spawned workers would otherwise re-run this script
+        # as __mp_main__ and then import main again, building everything twice
+        os.execvp(sys.executable, [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", "0.0.0.0", "--port", str(PORT), "--workers", str(WORKERS),
+        ])
+    else:
+        server.run(host="0.0.0.0")
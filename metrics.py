@@ -0,0 +1,247 @@
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+# Latency buckets in seconds, from sub-millisecond local work to slow LLM calls
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+# Prompt sizes in tokens, the provider caches prefixes from 1024 tokens up
+PROMPT_TOKEN_BUCKETS = (256, 512, 1024, 1536, 2048, 3072, 4096, 8192, 16384)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge:
+    """Value read from a callback at scrape time"""
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {_format_value(self.read())}",
+        ]
+
+
+class Histogram:
+    """
+    Bucketed histogram with optional sampling.
+
+    With sample_rate below 1 only that share of observations is recorded,
+    each weighted by 1 / sample_rate so counts and sums stay unbiased.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, sample_rate: float = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        if sample_rate is None:
+            sample_rate = float(os.getenv("TODO_METRICS_SAMPLE_RATE", "1.0"))
+        self.sample_rate = min(1.0, max(sample_rate, 0.0))
+        self._weight = 1.0 / self.sample_rate if self.sample_rate else 0.0
+        self._lock = threading.Lock()
+        # Label values -> [bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def sampled(self) -> bool:
+        """Whether the next observation should be recorded"""
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def observe(self, value: float, **labels):
+        if not self.sampled():
+            return
+        self._record(value, labels)
+
+    def _record(self, value: float, labels: Dict[str, str]):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            series[index] += self._weight
+            series[-1] += value * self._weight
+
+    def count(self, **labels) -> float:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            return sum(series[:-1]) if series else 0.0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {_format_value(cumulative)}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(cumulative)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collects metrics and renders them in the Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, read: Callable[[], float]) -> Gauge:
+        return self.register(Gauge(name, documentation, read))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                # A failing gauge callback must not break the whole scrape
+                continue
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "todo_stage_seconds",
+    "Time spent in each stage of handling a chat message",
+    ["stage"],
+)
+TIME_TO_FIRST_CHUNK_SECONDS = REGISTRY.histogram(
+    "todo_time_to_first_chunk_seconds",
+    "Time from receiving a streamed request to sending its first chunk",
+)
+LLM_TOKENS = REGISTRY.counter(
+    "todo_llm_tokens_total",
+    "Tokens reported by the OpenAI API, by type",
+    ["type"],
+)
+LLM_REQUESTS = REGISTRY.counter(
+    "todo_llm_requests_total",
+    "Chat completion calls made to OpenAI",
+)
+PROMPT_TOKENS = REGISTRY.histogram(
+    "todo_prompt_tokens",
+    "Prompt tokens sent per chat completion call",
+    buckets=PROMPT_TOKEN_BUCKETS,
+)
+REGISTRY.gauge(
+    "todo_prompt_cache_hit_ratio",
+    "Share of prompt tokens served from the provider's prompt cache",
+    lambda: LLM_TOKENS.value(type="cached") / (LLM_TOKENS.value(type="prompt") or 1),
+)
+ERRORS = REGISTRY.counter(
+    "todo_errors_total",
+    "Errors raised while handling chat messages, by exception type",
+    ["exception"],
+)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a block and record it under todo_stage_seconds{stage=...}"""
+    if not STAGE_SECONDS.sampled():
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS._record(time.perf_counter() - start, {"stage": stage})
+
+
+def record_usage(usage):
+    """Count tokens from a completion's usage block"""
+    if usage is None:
+        return
+    LLM_TOKENS.inc(usage.prompt_tokens or 0, type="prompt")
+    PROMPT_TOKENS.observe(usage.prompt_tokens or 0)
+    LLM_TOKENS.inc(usage.completion_tokens or 0, type="completion")
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details is not None else None
+    if cached:
+        LLM_TOKENS.inc(cached, type="cached")
+
+
+def record_error(error: BaseException):
+    ERRORS.inc(exception=type(error).__name__)
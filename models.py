@@ -1,6 +1,9 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Union
 from datetime import datetime
+import sys
+import time
+import uuid
 
 class TodoItem(BaseModel):
     id: str
@@ -28,3 +31,76 @@ class TodoResponse(BaseModel):
     text: str
     created_at: datetime
     completed: bool
+
+class TodoPage(BaseModel):
+    todos: List[TodoResponse]
+    # Pass back as ?cursor= for the next page, None after the last one
+    next_cursor: Optional[str] = None
+
+# TodoRecord ids: a uuid as an int, or a legacy string id
+TodoId = Union[int, str]
+
+
+class TodoRecord:
+    """
+    Compact in-memory todo, converted to TodoItem/TodoResponse only when serialized.
+
+    The id is the uuid4 as a 128-bit int and created_at is whole epoch
+    seconds. Texts are interned, so the same todo in many sessions is stored
+    once.
+    """
+
+    __slots__ = ("id", "text", "created_at", "completed")
+
+    def __init__(self, id: TodoId, text: str, created_at: int, completed: bool = False):
+        self.id = id
+        self.text = sys.intern(text)
+        self.created_at = created_at
+        self.completed = completed
+
+    @classmethod
+    def new(cls, text: str) -> "TodoRecord":
+        return cls(uuid.uuid4().int, text, int(time.time()))
+
+    @staticmethod
+    def parse_id(todo_id: str) -> TodoId:
+        """The int form of a uuid string, ids that aren't uuids are kept as they are"""
+        try:
+            return uuid.UUID(todo_id).int
+        except (ValueError, AttributeError, TypeError):
+            return todo_id
+
+    @staticmethod
+    def format_id(todo_id: TodoId) -> str:
+        return str(uuid.UUID(int=todo_id)) if isinstance(todo_id, int) else todo_id
+
+    @property
+    def id_str(self) -> str:
+        return self.format_id(self.id)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TodoRecord":
+        """From TodoItem fields, e.g. exported state"""
+        created_at = data["created_at"]
+        if isinstance(created_at, str):
+            created_at = datetime.fromisoformat(created_at)
+        if isinstance(created_at, datetime):
+            created_at = created_at.timestamp()
+        return cls(cls.parse_id(data["id"]), data["text"], int(created_at), bool(data.get("completed", False)))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The same JSON form as TodoItem.model_dump(mode="json")"""
+        return {
+            "id": self.id_str,
+            "text": self.text,
+            "created_at": datetime.fromtimestamp(self.created_at).isoformat(),
+            "completed": self.completed,
+        }
+
+    def to_item(self) -> TodoItem:
+        return TodoItem(id=self.id_str, text=self.text, created_at=datetime.fromtimestamp(self.created_at),
+                        completed=self.completed)
+
+    def to_response(self) -> TodoResponse:
+        return TodoResponse(id=self.id_str, text=self.text, created_at=datetime.fromtimestamp(self.created_at),
+                            completed=self.completed)
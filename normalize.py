@@ -0,0 +1,163 @@
+import re
+from functools import lru_cache
+from typing import Iterable, List, Optional
+
+# Action verbs to look for, earlier entries win when several appear
+ACTION_VERBS = (
+    'buy', 'get', 'call', 'schedule', 'visit', 'meet', 'go to', 'attend',
+    'pick up', 'drop off', 'send', 'email', 'text', 'message', 'book',
+    'reserve', 'order', 'cook', 'clean', 'organize', 'plan', 'prepare'
+)
+
+# Words dropped from the phrase that follows an action verb
+ACTION_FILLER_WORDS = frozenset([
+    'i', 'need', 'want', 'should', 'must', 'have', 'to', 'a', 'an', 'the'
+])
+
+# Common filler words to remove when there is no action verb (but keep action words)
+FILLER_WORDS = frozenset([
+    'add', 'need', 'want', 'should', 'must',
+    'purchase', 'acquire', 'obtain', 'fetch', 'grab'
+])
+FILLER_PHRASES = frozenset([('have', 'to'), ('pick', 'up')])
+FILLER_PHRASE_STARTS = frozenset(first for first, _ in FILLER_PHRASES)
+
+# Common articles and prepositions to remove
+ARTICLES_PREPS = frozenset([
+    'a', 'an', 'the', 'for', 'to', 'from', 'with', 'by', 'of', 'in', 'on', 'at'
+])
+
+CLEAN_STOPWORDS = FILLER_WORDS | ARTICLES_PREPS
+
+# Single-word verbs map to their priority, multi-word verbs form a trie on the first word
+_VERB_PRIORITY = {}
+_VERB_TRIE = {}
+for _priority, _verb in enumerate(ACTION_VERBS):
+    _first, *_rest = _verb.split()
+    if _rest:
+        _VERB_TRIE.setdefault(_first, {})[" ".join(_rest)] = _priority
+    else:
+        _VERB_PRIORITY[_first] = _priority
+_TRIGGER_WORDS = frozenset(_VERB_PRIORITY) | frozenset(_VERB_TRIE)
+
+# Punctuation that may be attached to a word, e.g. "call, then"
+_PUNCTUATION = ".,!?;:\"'()"
+_PUNCTUATION_RE = re.compile("[" + re.escape(_PUNCTUATION) + "]")
+
+
+def _find_action_word(keys: List[str]) -> Optional[int]:
+    """
+    Index of the word starting the highest priority action verb, or None.
+
+    Matching is per whole word, so "forget" doesn't contain "get" and
+    "textbook" doesn't contain "text".
+    """
+    hits = _TRIGGER_WORDS.intersection(keys)
+    if not hits:
+        return None
+
+    best = None
+    for word in hits:
+        priority = _VERB_PRIORITY.get(word)
+        if priority is not None:
+            candidate = (priority, keys.index(word))
+        else:
+            # Multi-word verb, find the first occurrence followed by its remainder
+            candidate = None
+            following = _VERB_TRIE[word]
+            index = keys.index(word)
+            while True:
+                if index + 1 < len(keys) and keys[index + 1] in following:
+                    candidate = (following[keys[index + 1]], index)
+                    break
+                try:
+                    index = keys.index(word, index + 1)
+                except ValueError:
+                    break
+        # The first occurrence of the highest priority verb wins
+        if candidate is not None and (best is None or candidate < best):
+            best = candidate
+    return best[1] if best is not None else None
+
+
+def starts_with_action(text: str) -> bool:
+    """Whether text begins with one of the action verbs"""
+    keys = [word.strip(_PUNCTUATION) for word in text.lower().split()[:2]]
+    if not keys:
+        return False
+    if keys[0] in _VERB_PRIORITY:
+        return True
+    return len(keys) > 1 and keys[1] in _VERB_TRIE.get(keys[0], ())
+
+
+def _remove_filler_phrases(words: List[str]) -> List[str]:
+    """Drop multi-word fillers such as 'have to'"""
+    result = []
+    skip = False
+    for index, word in enumerate(words):
+        if skip:
+            skip = False
+            continue
+        if index + 1 < len(words) and (word, words[index + 1]) in FILLER_PHRASES:
+            skip = True
+            continue
+        result.append(word)
+    return result
+
+
+def clean_todo_text(text: str) -> str:
+    """Clean and normalize todo text while preserving action context"""
+    words = text.lower().strip().split()
+    if not FILLER_PHRASE_STARTS.isdisjoint(words):
+        words = _remove_filler_phrases(words)
+
+    # Filter out filler words and articles/prepositions, but keep action words like 'buy', 'get'
+    filtered_words = [word for word in words if word not in CLEAN_STOPWORDS]
+
+    # Join words back together and capitalize first letter
+    if filtered_words:
+        return ' '.join(filtered_words).capitalize()
+    # If all words were filtered out, return original text
+    return text.strip()
+
+
+@lru_cache(maxsize=4096)
+def extract_action_and_item(text: str) -> str:
+    """Extract the action and item from user input, preserving the action context"""
+    text_lower = text.lower()
+    words = text_lower.split()
+
+    # Match on words without attached punctuation, e.g. "call, then"
+    keys = words
+    if _PUNCTUATION_RE.search(text_lower) is not None:
+        keys = [word.strip(_PUNCTUATION) for word in words]
+
+    # If we found an action verb, extract the complete action phrase
+    action_index = _find_action_word(keys)
+    if action_index is not None:
+        # Clean up the action phrase by removing common filler words
+        filtered_words = [word for word in words[action_index:] if word not in ACTION_FILLER_WORDS]
+        if filtered_words:
+            return ' '.join(filtered_words).capitalize()
+
+    # If no action verb found, use the original cleaning method
+    return clean_todo_text(text)
+
+
+def normalize_many(texts: Iterable[str]) -> List[str]:
+    """
+    Normalize a batch of todo texts, e.g. for bulk imports. Each distinct text
+    is normalized once, without touching the shared LRU cache. This is the
+    per-text engine in a loop: distinct texts run no faster than one by one
+    (about 1.1x the old list scans, see benchmarks/bench_normalize.py).
+    """
+    # Bypass the shared cache so a large import doesn't evict chat phrases
+    extract = extract_action_and_item.__wrapped__
+    seen = {}
+    results = []
+    for text in texts:
+        cleaned = seen.get(text)
+        if cleaned is None:
+            cleaned = seen[text] = extract(text)
+        results.append(cleaned)
+    return results
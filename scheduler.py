@@ -0,0 +1,231 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, List, Optional
+
+from metrics import REGISTRY
+from sessions import DEFAULT_SESSION_ID, SessionManager
+from todo_agent import TodoAgent
+
+QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "todo_queue_wait_seconds",
+    "Time from a message arriving to its processing starting, including the wait for a model slot",
+)
+COALESCED = REGISTRY.counter(
+    "todo_messages_coalesced_total",
+    "Messages merged into another message's model call",
+)
+SHED = REGISTRY.counter(
+    "todo_messages_shed_total",
+    "Messages that needed the model while it was at capacity, by how they were answered",
+    ["mode"],
+)
+
+# Reply to the earlier messages of a coalesced burst, the last one gets the answer
+COALESCED_REPLY = "Got it, I'll handle that together with your next message."
+BUSY_REPLY = "I'm handling a lot of requests right now, please try again in a moment."
+
+
+class _Job:
+    __slots__ = ("message", "future", "enqueued_at")
+
+    def __init__(self, message: str, future: asyncio.Future):
+        self.message = message
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+def _fail(jobs, error: BaseException):
+    for job in jobs:
+        if not job.future.done():
+            job.future.set_exception(error)
+
+
+class MessageScheduler:
+    """
+    Admission control in front of the session agents.
+
+    Each session's messages go through a FIFO drained by a single task, so a
+    burst is handled in order instead of racing for the session. Messages
+    that need the model and are queued together, because they arrived while
+    an earlier call was running or within coalesce_window seconds of each
+    other, are sent as one model call. coalesce=False sends each on its own.
+
+    Model calls are limited to max_concurrency at a time. A message that
+    would have to wait behind more than queue_limit others, or longer than
+    queue_timeout seconds, is shed: answered by the agent's local fallback
+    ("degrade") or turned away with a busy reply ("reject").
+    """
+
+    def __init__(self, sessions: SessionManager, max_concurrency: int = None, queue_limit: int = None,
+                 queue_timeout: float = None, coalesce: bool = None, coalesce_window: float = None,
+                 overload: str = None):
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv("TODO_MAX_LLM_CONCURRENCY", "64"))
+        if queue_limit is None:
+            queue_limit = int(os.getenv("TODO_QUEUE_LIMIT", "256"))
+        if queue_timeout is None:
+            queue_timeout = float(os.getenv("TODO_QUEUE_TIMEOUT", "10"))
+        if coalesce is None:
+            coalesce = os.getenv("TODO_COALESCE", "1") != "0"
+        if coalesce_window is None:
+            coalesce_window = float(os.getenv("TODO_COALESCE_WINDOW", "0"))
+        if overload is None:
+            overload = os.getenv("TODO_OVERLOAD", "degrade")
+        if overload not in ("degrade", "reject"):
+            raise ValueError(f"Unknown overload mode {overload!r}, expected 'degrade' or 'reject'")
+
+        self.sessions = sessions
+        self.max_concurrency = max_concurrency
+        self.queue_limit = queue_limit
+        self.queue_timeout = queue_timeout
+        self.coalesce = coalesce
+        self.coalesce_window = coalesce_window
+        self.overload = overload
+        # Created on first use, so the scheduler can be built outside the event loop
+        self._slots: Optional[asyncio.Semaphore] = None
+        # Session id -> messages not picked up yet, present while its drain task runs
+        self._queues: Dict[str, Deque[_Job]] = {}
+        # The event loop only keeps weak references to tasks
+        self._drains = set()
+        self.waiting = 0
+        self.in_flight = 0
+
+    def depth(self) -> int:
+        """Messages queued in sessions and not picked up yet"""
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def submit(self, session_id: Optional[str], message: str) -> str:
+        """Queue a message behind the session's earlier ones and return its reply"""
+        session_id = session_id or DEFAULT_SESSION_ID
+        job = _Job(message, asyncio.get_running_loop().create_future())
+        queue = self._queues.get(session_id)
+        if queue is None:
+            queue = self._queues[session_id] = deque()
+            task = asyncio.ensure_future(self._drain(session_id, queue))
+            self._drains.add(task)
+            task.add_done_callback(self._drains.discard)
+        queue.append(job)
+        return await job.future
+
+    async def stream(self, session_id: Optional[str], message: str) -> AsyncIterator[str]:
+        """Like submit for streamed replies, in order and within the model budget but never coalesced"""
+        enqueued_at = time.monotonic()
+        async with self.sessions.session(session_id) as agent:
+            if not agent.needs_model(message):
+                QUEUE_WAIT_SECONDS.observe(time.monotonic() - enqueued_at)
+                async for chunk in agent.process_message_stream(message):
+                    yield chunk
+                return
+            if not await self._acquire():
+                QUEUE_WAIT_SECONDS.observe(time.monotonic() - enqueued_at)
+                yield self._shed(agent, message)
+                return
+            QUEUE_WAIT_SECONDS.observe(time.monotonic() - enqueued_at)
+            try:
+                async for chunk in agent.process_message_stream(message):
+                    yield chunk
+            finally:
+                self._release()
+
+    async def _drain(self, session_id: str, queue: Deque[_Job]):
+        try:
+            while queue:
+                async with self.sessions.session(session_id) as agent:
+                    if self.coalesce and self.coalesce_window > 0 and agent.needs_model(queue[0].message):
+                        # Give the rest of a burst a moment to arrive
+                        delay = queue[0].enqueued_at + self.coalesce_window - time.monotonic()
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                    jobs = list(queue)
+                    queue.clear()
+                    try:
+                        await self._run(agent, jobs)
+                    except Exception as e:
+                        _fail(jobs, e)
+        finally:
+            # No await since the loop saw the queue empty, so nothing was added in between
+            del self._queues[session_id]
+            _fail(queue, RuntimeError("Session queue stopped"))
+
+    async def _run(self, agent: TodoAgent, jobs: List[_Job]):
+        """Answer jobs in order, merging consecutive ones that need the model"""
+        index = 0
+        while index < len(jobs):
+            job = jobs[index]
+            if not agent.needs_model(job.message):
+                QUEUE_WAIT_SECONDS.observe(time.monotonic() - job.enqueued_at)
+                await self._answer([job], agent.process_message_async(job.message))
+                index += 1
+                continue
+
+            batch = [job]
+            while self.coalesce and index + len(batch) < len(jobs) \
+                    and agent.needs_model(jobs[index + len(batch)].message):
+                batch.append(jobs[index + len(batch)])
+            index += len(batch)
+            await self._answer(batch, self._call_model(agent, batch))
+
+    async def _answer(self, batch: List[_Job], reply):
+        """Resolve a batch with the reply coroutine's result, or its error"""
+        try:
+            result = await reply
+        except Exception as e:
+            _fail(batch, e)
+            return
+        for job in batch[:-1]:
+            if not job.future.done():
+                job.future.set_result(COALESCED_REPLY)
+        if not batch[-1].future.done():
+            batch[-1].future.set_result(result)
+
+    async def _call_model(self, agent: TodoAgent, batch: List[_Job]) -> str:
+        admitted = await self._acquire()
+        now = time.monotonic()
+        for job in batch:
+            QUEUE_WAIT_SECONDS.observe(now - job.enqueued_at)
+        if not admitted:
+            # Each message is answered on its own, the local handler reads one request per message
+            for job in batch[:-1]:
+                if not job.future.done():
+                    job.future.set_result(self._shed(agent, job.message))
+            return self._shed(agent, batch[-1].message)
+        if len(batch) > 1:
+            COALESCED.inc(len(batch) - 1)
+        try:
+            # One message per line, the prompt already handles several items in a message. If the
+            # model can't be reached the agent's fallback reads the lines one by one
+            return await agent.process_message_async("\n".join(job.message for job in batch))
+        finally:
+            self._release()
+
+    async def _acquire(self) -> bool:
+        """Wait for a model slot, False when the message should be shed instead"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        if not self._slots.locked():
+            # A free slot is taken without yielding, so it can't be counted as waiting
+            await self._slots.acquire()
+        else:
+            if self.waiting >= self.queue_limit:
+                return False
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                self.waiting -= 1
+        self.in_flight += 1
+        return True
+
+    def _release(self):
+        self.in_flight -= 1
+        self._slots.release()
+
+    def _shed(self, agent: TodoAgent, message: str) -> str:
+        SHED.inc(mode=self.overload)
+        if self.overload == "reject":
+            return BUSY_REPLY
+        return agent.process_message_degraded(message)
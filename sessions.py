@@ -0,0 +1,390 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from storage import SqliteDatabase, SqliteTodoStorage, shared_database
+from todo_agent import TodoAgent
+from transport import Transport, shared_transport
+
+if TYPE_CHECKING:
+    import openai
+
+DEFAULT_SESSION_ID = "anonymous"
+# Where sessions are spilled when TODO_SESSION_DIR isn't set
+DEFAULT_SESSION_DIR = os.path.join("data", "sessions")
+
+
+class SessionStoreFull(Exception):
+    """Raised by SessionStore.save when there is no room, the session stays resident instead"""
+
+
+class SessionStore:
+    """Backing store that idle sessions are spilled to"""
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """The saved state, the store may forget it since the session is saved again on eviction"""
+        raise NotImplementedError
+
+    def save(self, session_id: str, state: Dict[str, Any]):
+        raise NotImplementedError
+
+    def delete(self, session_id: str):
+        raise NotImplementedError
+
+    def journal_for(self, session_id: str):
+        """Receiver for the session's individual todo changes, None if the store doesn't take them"""
+        return None
+
+    def close(self):
+        pass
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Keeps spilled sessions as compact JSON strings instead of live objects.
+
+    Nothing here survives a restart. The store holds at most max_entries
+    sessions and max_bytes of JSON; when full, save raises SessionStoreFull
+    and the session manager keeps the session resident rather than losing
+    it. A session is removed from the store when it is loaded back.
+    """
+
+    def __init__(self, max_entries: int = None, max_bytes: int = None):
+        if max_entries is None:
+            max_entries = int(os.getenv("TODO_SPILLED_SESSIONS", "100000"))
+        if max_bytes is None:
+            max_bytes = int(os.getenv("TODO_SPILLED_SESSION_BYTES", str(256 * 1024 * 1024)))
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Session id -> JSON
+        self._data: Dict[str, str] = {}
+        self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            raw = self._pop(session_id)
+        return json.loads(raw) if raw is not None else None
+
+    def save(self, session_id: str, state: Dict[str, Any]):
+        raw = json.dumps(state, separators=(",", ":"))
+        with self._lock:
+            previous = self._data.get(session_id)
+            entries = len(self._data) + (previous is None)
+            size = self._bytes + len(raw) - len(previous or "")
+            if entries > self.max_entries or size > self.max_bytes:
+                raise SessionStoreFull(f"Spilled session store is full ({len(self._data)} sessions, {self._bytes} bytes)")
+            self._data[session_id] = raw
+            self._bytes = size
+
+    def _pop(self, session_id: str) -> Optional[str]:
+        """Caller holds self._lock"""
+        raw = self._data.pop(session_id, None)
+        if raw is not None:
+            self._bytes -= len(raw)
+        return raw
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._pop(session_id)
+
+
+class JsonFileSessionStore(SessionStore):
+    """Stores each spilled session as a JSON file in a directory"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, session_id: str) -> str:
+        # Session ids come from the client, so never use them as file names directly
+        digest = hashlib.sha256(session_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(session_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, session_id: str, state: Dict[str, Any]):
+        path = self._path(session_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def delete(self, session_id: str):
+        try:
+            os.remove(self._path(session_id))
+        except FileNotFoundError:
+            pass
+
+
+class Session:
+    """A resident session: its agent plus bookkeeping for eviction"""
+
+    __slots__ = ("session_id", "agent", "lock", "last_used", "in_use", "spilling")
+
+    def __init__(self, session_id: str, agent: TodoAgent):
+        self.session_id = session_id
+        self.agent = agent
+        # Serializes messages within the session, sessions never share it
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+        self.in_use = 0
+        # Set while a copy of the state is being saved, so it isn't saved twice at once
+        self.spilling = False
+
+
+class _Shard:
+    __slots__ = ("lock", "sessions", "evicted", "loading")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Ordered from least to most recently used
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+        # Evicted sessions until the store has their state, they are taken back if used again
+        self.evicted: Dict[str, Session] = {}
+        # Sessions being loaded from the store, so each is loaded once
+        self.loading: Dict[str, asyncio.Task] = {}
+
+
+class SessionManager:
+    """
+    Holds one TodoAgent per user or conversation.
+
+    Sessions are spread over lock-striped shards so lookups for unrelated
+    sessions don't contend. Each shard is an LRU bounded to its share of
+    max_sessions, and sessions idle for longer than ttl seconds are evicted.
+    Evicted sessions are spilled to the store and reloaded on next use; the
+    store is only read and written outside the shard locks and off the
+    event loop.
+    """
+
+    def __init__(
+        self,
+        store: SessionStore = None,
+        max_sessions: int = None,
+        ttl: float = None,
+        shards: int = 16,
+        client: "openai.OpenAI" = None,
+        async_client: "openai.AsyncOpenAI" = None,
+        database: SqliteDatabase = None,
+    ):
+        if store is None:
+            journal_dir = os.getenv("TODO_JOURNAL_DIR")
+            session_dir = os.getenv("TODO_SESSION_DIR")
+            if journal_dir:
+                # Imported here, journal.py builds on this module
+                from journal import JournalSessionStore
+                store = JournalSessionStore(journal_dir)
+            elif session_dir is None or session_dir:
+                store = JsonFileSessionStore(session_dir or DEFAULT_SESSION_DIR)
+            else:
+                store = InMemorySessionStore()
+        if max_sessions is None:
+            max_sessions = int(os.getenv("TODO_MAX_SESSIONS", "10000"))
+        if ttl is None:
+            ttl = float(os.getenv("TODO_SESSION_TTL", "1800"))
+
+        self.store = store
+        self.ttl = ttl
+        self._shards: List[_Shard] = [_Shard() for _ in range(shards)]
+        self._shard_capacity = max(1, max_sessions // shards)
+
+        # One pair of clients, connection pools and circuit breaker for every session
+        self.transport = Transport(client, async_client) if client or async_client else shared_transport()
+        # Todos live in this database when set (TODO_DATABASE), so several workers can share them
+        self.database = database or shared_database()
+
+        # sweep() on a timer while the server runs, see start_sweeper
+        self._sweeper: Optional[asyncio.Task] = None
+
+        self._stats_lock = threading.Lock()
+        self.created = 0
+        self.restored = 0
+        self.evicted = 0
+
+    def _shard_for(self, session_id: str) -> _Shard:
+        return self._shards[zlib.crc32(session_id.encode("utf-8")) % len(self._shards)]
+
+    def _new_agent(self, session_id: str) -> TodoAgent:
+        storage = SqliteTodoStorage(self.database, session_id) if self.database is not None else None
+        return TodoAgent(transport=self.transport, storage=storage)
+
+    def _count(self, name: str, amount: int = 1):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def _evict(self, shard: _Shard, now: float) -> List[Session]:
+        """
+        Take expired sessions and those over the shard's capacity out of it,
+        caller holds shard.lock and passes the result to _spill after
+        releasing it.
+        """
+        victims = []
+        for session in shard.sessions.values():
+            if session.in_use or session.spilling:
+                continue
+            expired = now - session.last_used > self.ttl
+            over_capacity = len(shard.sessions) - len(victims) > self._shard_capacity
+            if not expired and not over_capacity:
+                break
+            victims.append(session)
+
+        for session in victims:
+            del shard.sessions[session.session_id]
+            shard.evicted[session.session_id] = session
+            session.spilling = True
+        return victims
+
+    def _spill(self, shard: _Shard, victims: List[Session]):
+        """Save evicted sessions to the store, blocks so run it off the event loop"""
+        spilled = 0
+        for session in victims:
+            try:
+                self.store.save(session.session_id, session.agent.export_state())
+                saved = True
+            except SessionStoreFull:
+                saved = False
+            with shard.lock:
+                session.spilling = False
+                if shard.evicted.get(session.session_id) is not session:
+                    # Used again while it was being saved, it is resident again
+                    continue
+                del shard.evicted[session.session_id]
+                if saved:
+                    spilled += 1
+                else:
+                    # Nowhere to put it, keep it for another ttl instead of losing it
+                    session.last_used = time.monotonic()
+                    shard.sessions[session.session_id] = session
+        if spilled:
+            self._count("evicted", spilled)
+
+    def _restore(self, session_id: str) -> Session:
+        """Build the session from its stored state, blocks so run it off the event loop"""
+        agent = self._new_agent(session_id)
+        state = self.store.load(session_id)
+        if state is not None:
+            agent.load_state(state)
+            self._count("restored")
+        else:
+            self._count("created")
+        agent.journal = self.store.journal_for(session_id)
+        return Session(session_id, agent)
+
+    async def _load(self, shard: _Shard, session_id: str):
+        try:
+            session = await asyncio.to_thread(self._restore, session_id)
+            with shard.lock:
+                shard.sessions[session_id] = session
+        finally:
+            with shard.lock:
+                del shard.loading[session_id]
+
+    async def _checkout(self, session_id: str) -> Session:
+        shard = self._shard_for(session_id)
+        while True:
+            with shard.lock:
+                session = shard.sessions.get(session_id) or shard.evicted.pop(session_id, None)
+                if session is not None:
+                    shard.sessions[session_id] = session
+                    shard.sessions.move_to_end(session_id)
+                    session.last_used = time.monotonic()
+                    session.in_use += 1
+                    victims = self._evict(shard, session.last_used)
+                    break
+                loading = shard.loading.get(session_id)
+                if loading is None:
+                    # A task of its own, so a cancelled request can't lose a state the store handed over
+                    loading = shard.loading[session_id] = asyncio.ensure_future(self._load(shard, session_id))
+            await asyncio.shield(loading)
+        if victims:
+            await asyncio.to_thread(self._spill, shard, victims)
+        return session
+
+    def _release(self, session: Session):
+        shard = self._shard_for(session.session_id)
+        with shard.lock:
+            session.in_use -= 1
+            session.last_used = time.monotonic()
+
+    @asynccontextmanager
+    async def session(self, session_id: Optional[str]):
+        """Yield the session's agent, holding its lock for the duration"""
+        session = await self._checkout(session_id or DEFAULT_SESSION_ID)
+        try:
+            async with session.lock:
+                yield session.agent
+        finally:
+            self._release(session)
+
+    def sweep(self):
+        """Evict expired sessions from every shard"""
+        now = time.monotonic()
+        for shard in self._shards:
+            with shard.lock:
+                victims = self._evict(shard, now)
+            self._spill(shard, victims)
+
+    async def _sweep_periodically(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            # Spilling to a file or journal store blocks, keep it off the event loop
+            await asyncio.to_thread(self.sweep)
+
+    def start_sweeper(self, interval: float = None):
+        """
+        Run sweep() every interval seconds (TODO_SWEEP_INTERVAL) from the
+        running event loop, so idle sessions are spilled on time even when
+        no other session lands on their shard. Stopped by close().
+        """
+        if interval is None:
+            interval = float(os.getenv("TODO_SWEEP_INTERVAL", "60"))
+        if self._sweeper is None and interval > 0:
+            self._sweeper = asyncio.ensure_future(self._sweep_periodically(interval))
+
+    def flush(self):
+        """Spill every idle resident session to the store, e.g. on shutdown"""
+        for shard in self._shards:
+            with shard.lock:
+                idle = [session for session in shard.sessions.values() if not session.in_use]
+            for session in idle:
+                try:
+                    self.store.save(session.session_id, session.agent.export_state())
+                except SessionStoreFull:
+                    # Only the in-memory store fills up, and it doesn't outlive the process anyway
+                    break
+
+    def close(self):
+        """Spill every session and close the store, e.g. on shutdown"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        self.flush()
+        self.store.close()
+
+    def __len__(self) -> int:
+        return sum(len(shard.sessions) for shard in self._shards)
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return {
+                "resident": len(self),
+                "created": self.created,
+                "restored": self.restored,
+                "evicted": self.evicted,
+            }
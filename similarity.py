@@ -0,0 +1,203 @@
+import os
+import zlib
+from functools import lru_cache
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from categories import categories_of, category_query, words
+
+# Hashed feature space, collisions are rare enough at this size for short todo texts
+DIM = 256
+_MASK = DIM - 1
+# Texts counted per bincount, keeps its int64 scratch array at 8 MB however many todos are indexed
+CHUNK_ROWS = 4096
+# Cosine score a fuzzy match needs, "mlk" vs "Buy milk" scores about 0.33
+MATCH_THRESHOLD = float(os.getenv("TODO_MATCH_THRESHOLD", "0.3"))
+# Fuzzy matches also need this share of the best score. A fuzzy delete only acts when a single
+# todo is left, "item 10" after it was deleted shouldn't remove "item 11"
+RELATIVE_THRESHOLD = 0.75
+# Score a single fuzzy match needs to be deleted without asking, "water plant" vs "Water plants"
+# scores about 0.9. "milk" vs "Buy silk" (0.31) or "parent" vs "Pay rent" (0.58) need a "yes"
+DIRECT_DELETE_THRESHOLD = float(os.getenv("TODO_DIRECT_DELETE_THRESHOLD", "0.85"))
+
+# Words that would make unrelated todos look alike
+STOP_WORDS = frozenset({"the", "a", "an", "my", "to", "for", "of", "and", "some", "at", "on", "in", "with"})
+
+
+@lru_cache(maxsize=65536)
+def _word_features(word: str) -> Tuple[int, ...]:
+    """Hashed character bigrams and trigrams of a word, cached since todo lists repeat words a lot"""
+    padded = f" {word} "
+    return tuple(
+        zlib.crc32(padded[i:i + n].encode("utf-8")) & _MASK
+        for n in (2, 3)
+        for i in range(len(padded) - n + 1)
+    )
+
+
+def _features(text: str) -> List[int]:
+    return [feature for word in words(text) if word not in STOP_WORDS for feature in _word_features(word)]
+
+
+def vectorize_many(texts: List[str], out: np.ndarray = None) -> np.ndarray:
+    """
+    One row per text: L2-normalized counts of hashed character bigrams and
+    trigrams, bigrams keep typos close. Counted with one bincount per
+    CHUNK_ROWS texts, so bulk builds don't pay NumPy's per-call overhead per
+    todo, and written into out (rows of an index) when given, so no scratch
+    array grows with the number of texts.
+    """
+    vectors = np.empty((len(texts), DIM), dtype=np.float32) if out is None else out
+    for start in range(0, len(texts), CHUNK_ROWS):
+        chunk = texts[start:start + CHUNK_ROWS]
+        flat = [row * DIM + feature for row, text in enumerate(chunk) for feature in _features(text)]
+        counts = np.bincount(flat, minlength=len(chunk) * DIM).astype(np.float32).reshape(len(chunk), DIM)
+        norms = np.linalg.norm(counts, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        np.divide(counts, norms, out=vectors[start:start + len(chunk)])
+    return vectors
+
+
+def vectorize(text: str) -> np.ndarray:
+    return vectorize_many([text])[0]
+
+
+class SimilarityIndex:
+    """
+    Fuzzy and category matching over one session's todos.
+
+    Every todo is a row of a NumPy matrix holding its hashed n-gram vector,
+    plus a category bitmask. A query is scored against all rows with one
+    matrix-vector product, weighting the query's features by inverse
+    document frequency (the BM25 convention of applying IDF on the query
+    side), so common trigrams like "buy" count for little.
+
+    Removed rows are zeroed and compacted away once they make up half the
+    matrix, so rows stay in insertion order.
+    """
+
+    def __init__(self, capacity: int = 16):
+        self._vectors = np.zeros((capacity, DIM), dtype=np.float32)
+        self._categories = np.zeros(capacity, dtype=np.uint32)
+        # Rows holding each feature, for the IDF weights
+        self._df = np.zeros(DIM, dtype=np.float32)
+        self._ids: List = []
+        self._rows: Dict = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _grow(self, needed: int = 1):
+        capacity = max(16, len(self._vectors) * 2, self._size + needed)
+        vectors = np.zeros((capacity, DIM), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        categories = np.zeros(capacity, dtype=np.uint32)
+        categories[:self._size] = self._categories[:self._size]
+        self._vectors, self._categories = vectors, categories
+
+    def add(self, todo_id, text: str):
+        if self._size == len(self._vectors):
+            self._grow()
+        row = self._size
+        vector = vectorize(text)
+        self._vectors[row] = vector
+        self._categories[row] = categories_of(text)
+        self._df += vector > 0
+        self._ids.append(todo_id)
+        self._rows[todo_id] = row
+        self._size += 1
+
+    def remove(self, todo_id):
+        row = self._rows.pop(todo_id, None)
+        if row is None:
+            return
+        self._df -= self._vectors[row] > 0
+        self._vectors[row] = 0.0
+        self._categories[row] = 0
+        self._ids[row] = None
+        if len(self._rows) * 2 < self._size:
+            self._compact()
+
+    def _compact(self):
+        live = [row for row in range(self._size) if self._ids[row] is not None]
+        count = len(live)
+        self._vectors[:count] = self._vectors[live]
+        self._vectors[count:self._size] = 0.0
+        self._categories[:count] = self._categories[live]
+        self._categories[count:self._size] = 0
+        self._ids = [self._ids[row] for row in live]
+        self._rows = {todo_id: row for row, todo_id in enumerate(self._ids)}
+        self._size = count
+
+    def clear(self):
+        self.__init__()
+
+    def extend(self, todos: Iterable[Tuple[object, str]]):
+        """Index (id, text) pairs after the existing rows, vectorized together"""
+        todos = list(todos)
+        if not todos:
+            return
+        if self._size + len(todos) > len(self._vectors):
+            self._grow(len(todos))
+        start, end = self._size, self._size + len(todos)
+        vectorize_many([text for _, text in todos], out=self._vectors[start:end])
+        self._categories[start:end] = [categories_of(text) for _, text in todos]
+        self._df += (self._vectors[start:end] > 0).sum(axis=0)
+        for row, (todo_id, _) in enumerate(todos, start):
+            self._ids.append(todo_id)
+            self._rows[todo_id] = row
+        self._size = end
+
+    def rebuild(self, todos: Iterable[Tuple[object, str]]):
+        """Index (id, text) pairs from scratch"""
+        todos = list(todos)
+        self.__init__(capacity=max(16, len(todos)))
+        self.extend(todos)
+
+    def search(self, query: str, threshold: float = MATCH_THRESHOLD, limit: int = None) -> List[Tuple[object, float]]:
+        """(id, score) of todos similar to query, best first"""
+        if not self._rows:
+            return []
+        weights = np.log((1.0 + len(self._rows)) / (1.0 + self._df)) + 1.0
+        query_vector = vectorize(query) * weights
+        norm = float(np.linalg.norm(query_vector))
+        if not norm:
+            return []
+        query_vector /= norm
+        # Rows are unit length, so this is the cosine similarity with every todo at once
+        scores = self._vectors[:self._size] @ query_vector
+        rows = np.flatnonzero(scores >= threshold)
+        rows = rows[np.argsort(-scores[rows], kind="stable")]
+        if limit is not None:
+            rows = rows[:limit]
+        ids = self._ids
+        return [(ids[row], score) for row, score in zip(rows.tolist(), scores[rows].tolist())]
+
+    def in_categories(self, mask: int) -> List:
+        """Ids of todos in any of the categories, in insertion order"""
+        if not mask or not self._rows:
+            return []
+        rows = np.flatnonzero(self._categories[:self._size] & np.uint32(mask))
+        ids = self._ids
+        return [ids[row] for row in rows.tolist()]
+
+    def match(self, query: str) -> Tuple[str, List]:
+        """
+        Ids for a delete or filter query and how they were found: "category"
+        when the query only names categories, "close" for a single match
+        scoring at least DIRECT_DELETE_THRESHOLD, else "fuzzy" with the
+        matches above the threshold and close to the best one, best first.
+        """
+        mask = category_query(query)
+        if mask:
+            return "category", self.in_categories(mask)
+        hits = self.search(query)
+        if not hits:
+            return "fuzzy", []
+        cutoff = hits[0][1] * RELATIVE_THRESHOLD
+        ids = [todo_id for todo_id, score in hits if score >= cutoff]
+        if len(ids) == 1 and hits[0][1] >= DIRECT_DELETE_THRESHOLD:
+            return "close", ids
+        return "fuzzy", ids
@@ -0,0 +1,545 @@
+import bisect
+import hashlib
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from models import TodoId, TodoRecord
+from todo_index import TodoIndex
+
+# similarity imports NumPy, only loaded once a session needs fuzzy matching
+if TYPE_CHECKING:
+    from similarity import SimilarityIndex
+
+# Text hashes are summed modulo a prime below 2**63 so the sum fits an SQLite integer
+_HASH_MODULUS = (1 << 61) - 1
+
+
+def _text_hash(text_lower: str) -> int:
+    digest = hashlib.blake2b(text_lower.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % _HASH_MODULUS
+
+
+class TodoStorage:
+    """
+    A session's todos and bulk-deletion confirmation state.
+
+    TodoAgent makes every change through this interface. Changes made inside
+    transaction() are applied atomically.
+    """
+
+    # Durable storages keep todos and confirmation state themselves, so they
+    # are left out of the state spilled to a SessionStore
+    durable = False
+    # match() index of storages that don't keep one up to date, with the fingerprint it was built at
+    _similarity: Optional["SimilarityIndex"] = None
+    _similarity_fingerprint: Optional[str] = None
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        yield
+
+    def add(self, todo: TodoRecord):
+        raise NotImplementedError
+
+    def add_many(self, todos: List[TodoRecord]):
+        """Add todos known not to be duplicates, e.g. a bulk import"""
+        for todo in todos:
+            self.add(todo)
+
+    def find_duplicate(self, text: str) -> Optional[TodoId]:
+        """Id of a todo with the same text ignoring case"""
+        raise NotImplementedError
+
+    def search(self, query: str) -> List[TodoId]:
+        """Ids of todos containing query ignoring case, in insertion order"""
+        raise NotImplementedError
+
+    def match(self, query: str) -> Tuple[str, List[TodoId]]:
+        """
+        Ids of todos in the categories the query names ("grocery items") or
+        fuzzily similar to it, see SimilarityIndex.match. Used once a literal
+        search has come up empty.
+        """
+        # Rebuilt from scratch whenever the list changed since the last query
+        fingerprint = self.fingerprint()
+        index = self._similarity
+        if index is None or self._similarity_fingerprint != fingerprint:
+            from similarity import SimilarityIndex
+            index = SimilarityIndex()
+            index.rebuild(self._similarity_items())
+            self._similarity, self._similarity_fingerprint = index, fingerprint
+        return index.match(query)
+
+    def _similarity_items(self) -> Iterable[Tuple[TodoId, str]]:
+        return ((todo.id, todo.text) for todo in self.records())
+
+    def remove(self, todo_ids: List[TodoId]) -> List[str]:
+        """Delete todos by id, returns the texts of those that still existed"""
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def replace(self, todos: Iterable[TodoRecord], sequence: Optional[Dict[str, Any]] = None):
+        """Swap the whole list, e.g. when restoring a spilled session with its export_sequence()"""
+        raise NotImplementedError
+
+    def export_sequence(self) -> Optional[Dict[str, Any]]:
+        """Page cursor state to spill along with records(), None for storages that keep it themselves"""
+        return None
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def texts(self, todo_ids: Optional[List[TodoId]] = None) -> List[str]:
+        """Todo texts in insertion order, or of todo_ids in their order"""
+        raise NotImplementedError
+
+    def records(self) -> List[TodoRecord]:
+        """Todos in insertion order, converted to TodoItem only at the API boundary"""
+        raise NotImplementedError
+
+    def fingerprint(self) -> str:
+        """Changes whenever the set of todo texts does"""
+        raise NotImplementedError
+
+    def version(self) -> str:
+        """Changes on every add or remove, unlike fingerprint also when a todo is deleted and re-added"""
+        raise NotImplementedError
+
+    def page(self, after: Optional[int], limit: int) -> Tuple[List[TodoRecord], Optional[int]]:
+        """
+        Up to limit todos in insertion order, starting after the cursor
+        (None for the first page). Returns them with the cursor of the next
+        page, None after the last one. Cursors are insertion sequence numbers,
+        so pages stay consistent while todos are added or removed.
+        """
+        raise NotImplementedError
+
+    def get_confirmation(self) -> Tuple[bool, Optional[str]]:
+        """(waiting_for_confirmation, pending_action)"""
+        raise NotImplementedError
+
+    def set_confirmation(self, waiting: bool, pending_action: Optional[str]):
+        raise NotImplementedError
+
+
+class InMemoryTodoStorage(TodoStorage):
+    """Todos in a dict with a TodoIndex, private to one process"""
+
+    def __init__(self):
+        self.todos = {}
+        # Duplicate and substring lookups over self.todos, updated on every change
+        self.index = TodoIndex()
+        # Fuzzy and category matching, built on the first match() and then kept up to date
+        self.similarity: Optional["SimilarityIndex"] = None
+        # Bumped on every change, see version()
+        self._version = 0
+        # Todos and their insertion sequence numbers for page(), rebuilt after a removal
+        self._ordered: Optional[List[TodoRecord]] = None
+        self._sequence: Optional[List[int]] = None
+        self.waiting_for_confirmation = False
+        self.pending_action = None
+
+    def add(self, todo: TodoRecord):
+        self.todos[todo.id] = todo
+        self.index.add(todo.id, todo.text)
+        if self.similarity is not None:
+            self.similarity.add(todo.id, todo.text)
+        if self._ordered is not None:
+            # New todos sort last, so the page order stays valid
+            self._ordered.append(todo)
+            self._sequence.append(self.index.order_of(todo.id))
+        self._version += 1
+
+    def find_duplicate(self, text: str) -> Optional[TodoId]:
+        return self.index.find_duplicate(text)
+
+    def search(self, query: str) -> List[TodoId]:
+        return self.index.search(query)
+
+    def match(self, query: str) -> Tuple[str, List[TodoId]]:
+        if self.similarity is None:
+            from similarity import SimilarityIndex
+            self.similarity = SimilarityIndex()
+            self.similarity.rebuild((todo.id, todo.text) for todo in self.todos.values())
+        return self.similarity.match(query)
+
+    def remove(self, todo_ids: List[TodoId]) -> List[str]:
+        texts = []
+        for todo_id in todo_ids:
+            # Already gone, like a confirmed delete whose todo was removed in the meantime
+            todo = self.todos.pop(todo_id, None)
+            if todo is None:
+                continue
+            texts.append(todo.text)
+            self.index.remove(todo_id)
+            if self.similarity is not None:
+                self.similarity.remove(todo_id)
+        self._ordered = self._sequence = None
+        self._version += 1
+        return texts
+
+    def clear(self):
+        self.todos.clear()
+        self.index.clear()
+        if self.similarity is not None:
+            self.similarity.clear()
+        self._ordered = self._sequence = None
+        self._version += 1
+
+    def replace(self, todos: Iterable[TodoRecord], sequence: Optional[Dict[str, Any]] = None):
+        self.todos = {todo.id: todo for todo in todos}
+        if sequence:
+            orders = {TodoRecord.parse_id(todo_id): order for todo_id, order in sequence["orders"].items()}
+            self.index.rebuild(self.todos.values(), orders, sequence["next"])
+        else:
+            self.index.rebuild(self.todos.values())
+        if self.similarity is not None:
+            self.similarity.rebuild((todo.id, todo.text) for todo in self.todos.values())
+        self._ordered = self._sequence = None
+        self._version += 1
+
+    def export_sequence(self) -> Optional[Dict[str, Any]]:
+        # Keyed by id, a journaled session may have todos the spilled state never saw
+        orders = {TodoRecord.format_id(todo_id): self.index.order_of(todo_id) for todo_id in self.todos}
+        return {"next": self.index.next_seq, "orders": orders}
+
+    def count(self) -> int:
+        return len(self.todos)
+
+    def texts(self, todo_ids: Optional[List[TodoId]] = None) -> List[str]:
+        if todo_ids is not None:
+            return [self.todos[todo_id].text for todo_id in todo_ids]
+        return [todo.text for todo in self.todos.values()]
+
+    def records(self) -> List[TodoRecord]:
+        return list(self.todos.values())
+
+    def fingerprint(self) -> str:
+        return self.index.fingerprint
+
+    def version(self) -> str:
+        return str(self._version)
+
+    def page(self, after: Optional[int], limit: int) -> Tuple[List[TodoRecord], Optional[int]]:
+        if self._ordered is None:
+            self._ordered = list(self.todos.values())
+            self._sequence = [self.index.order_of(todo.id) for todo in self._ordered]
+        start = 0 if after is None else bisect.bisect_right(self._sequence, after)
+        end = start + limit
+        next_cursor = self._sequence[end - 1] if end < len(self._ordered) else None
+        return self._ordered[start:end], next_cursor
+
+    def get_confirmation(self) -> Tuple[bool, Optional[str]]:
+        return self.waiting_for_confirmation, self.pending_action
+
+    def set_confirmation(self, waiting: bool, pending_action: Optional[str]):
+        self.waiting_for_confirmation = waiting
+        self.pending_action = pending_action
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS todos (
+    -- AUTOINCREMENT: a deleted last row's seq is never handed out again
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    id TEXT NOT NULL UNIQUE,
+    text TEXT NOT NULL,
+    text_lower TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS todos_session_text ON todos (session_id, text_lower);
+CREATE INDEX IF NOT EXISTS todos_session_seq ON todos (session_id, seq);
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    waiting_for_confirmation INTEGER NOT NULL DEFAULT 0,
+    pending_action TEXT,
+    todo_count INTEGER NOT NULL DEFAULT 0,
+    state_hash INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+"""
+
+
+class SqliteDatabase:
+    """
+    A SQLite database in WAL mode, shared by every session and worker process.
+
+    Each thread gets its own connection with a prepared statement cache, all
+    SQL used by SqliteTodoStorage is constant so statements are parsed once.
+    """
+
+    def __init__(self, path: str, statement_cache: int = 128, busy_timeout: float = 5.0):
+        self.path = path
+        self.statement_cache = statement_cache
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        connection = self.connection()
+        connection.executescript(SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # isolation_level=None: transactions are started explicitly with BEGIN IMMEDIATE
+            connection = sqlite3.connect(
+                self.path,
+                timeout=self.busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+                cached_statements=self.statement_cache,
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            # Durable at checkpoints, a power cut can only lose the last commits
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.depth = 0
+        return connection
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction, nested calls join the outermost one"""
+        connection = self.connection()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield connection
+            finally:
+                self._local.depth -= 1
+            return
+
+        # IMMEDIATE takes the write lock up front, so read-then-write can't race another worker
+        connection.execute("BEGIN IMMEDIATE")
+        self._local.depth = 1
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        else:
+            connection.execute("COMMIT")
+        finally:
+            self._local.depth = 0
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+class SqliteTodoStorage(TodoStorage):
+    """One session's rows in a shared SqliteDatabase, visible to every worker"""
+
+    durable = True
+
+    def __init__(self, database: SqliteDatabase, session_id: str):
+        self.database = database
+        self.session_id = session_id
+        # Last seq in the match() index, it is extended with newer rows and rebuilt after a removal
+        self._similarity_seq = 0
+
+    def transaction(self):
+        return self.database.transaction()
+
+    def _update_session(self, connection: sqlite3.Connection, count_delta: int, hash_delta: int):
+        connection.execute(
+            "INSERT INTO sessions (session_id, todo_count, state_hash) VALUES (?, ?, ?) "
+            "ON CONFLICT (session_id) DO UPDATE SET todo_count = todo_count + excluded.todo_count, "
+            "state_hash = (state_hash + excluded.state_hash) % " + str(_HASH_MODULUS),
+            (self.session_id, count_delta, hash_delta % _HASH_MODULUS),
+        )
+
+    def add(self, todo: TodoRecord):
+        text_lower = todo.text.lower()
+        with self.database.transaction() as connection:
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO todos (session_id, id, text, text_lower, created_at, completed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self.session_id, todo.id_str, todo.text, text_lower, todo.created_at, int(todo.completed)),
+            )
+            if cursor.rowcount:
+                self._update_session(connection, 1, _text_hash(text_lower))
+
+    def add_many(self, todos: List[TodoRecord]):
+        if not todos:
+            return
+        rows = [
+            (self.session_id, todo.id_str, todo.text, todo.text.lower(), todo.created_at, int(todo.completed))
+            for todo in todos
+        ]
+        with self.database.transaction() as connection:
+            connection.executemany(
+                "INSERT INTO todos (session_id, id, text, text_lower, created_at, completed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._update_session(connection, len(rows), sum(_text_hash(row[3]) for row in rows))
+
+    def find_duplicate(self, text: str) -> Optional[TodoId]:
+        row = self.database.connection().execute(
+            "SELECT id FROM todos WHERE session_id = ? AND text_lower = ?",
+            (self.session_id, text.lower()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def search(self, query: str) -> List[TodoId]:
+        # instr() rather than LIKE, so % and _ in the query match literally
+        rows = self.database.connection().execute(
+            "SELECT id FROM todos WHERE session_id = ? AND instr(text_lower, ?) > 0 ORDER BY seq",
+            (self.session_id, query.lower()),
+        )
+        return [row[0] for row in rows]
+
+    def _rows_after(self, seq: int) -> Tuple[int, List[Tuple[int, str, str]]]:
+        """The todo count and (seq, id, text) of todos after seq, read by one statement so they agree"""
+        rows = self.database.connection().execute(
+            "SELECT s.todo_count, t.seq, t.id, t.text FROM sessions s "
+            "LEFT JOIN todos t ON t.session_id = s.session_id AND t.seq > ? "
+            "WHERE s.session_id = ? ORDER BY t.seq",
+            (seq, self.session_id),
+        ).fetchall()
+        if not rows:
+            return 0, []
+        return rows[0][0], [row[1:] for row in rows if row[1] is not None]
+
+    def match(self, query: str) -> Tuple[str, List[TodoId]]:
+        # Only todos added since the last query are vectorized. Seqs only grow, so fewer rows than
+        # the count expects means some were removed, e.g. by another worker, and the index is rebuilt
+        index = self._similarity
+        count, added = self._rows_after(self._similarity_seq if index is not None else -1)
+        if index is not None and len(index) + len(added) != count:
+            index = None
+            count, added = self._rows_after(-1)
+        if index is None:
+            from similarity import SimilarityIndex
+            index = self._similarity = SimilarityIndex()
+        if added:
+            # The stored id strings, which remove() expects
+            index.extend((todo_id, text) for _, todo_id, text in added)
+            self._similarity_seq = added[-1][0]
+        return index.match(query)
+
+    def remove(self, todo_ids: List[TodoId]) -> List[str]:
+        texts = []
+        with self.database.transaction() as connection:
+            for todo_id in todo_ids:
+                row = connection.execute(
+                    "DELETE FROM todos WHERE session_id = ? AND id = ? RETURNING text, text_lower",
+                    (self.session_id, todo_id),
+                ).fetchone()
+                if row is not None:
+                    texts.append(row[0])
+                    self._update_session(connection, -1, -_text_hash(row[1]))
+                    if self._similarity is not None:
+                        # Own removals keep the index, a rolled back one shows up as a count mismatch
+                        self._similarity.remove(todo_id)
+        return texts
+
+    def clear(self):
+        with self.database.transaction() as connection:
+            connection.execute("DELETE FROM todos WHERE session_id = ?", (self.session_id,))
+            connection.execute(
+                "UPDATE sessions SET todo_count = 0, state_hash = 0 WHERE session_id = ?", (self.session_id,)
+            )
+
+    def replace(self, todos: Iterable[TodoRecord], sequence: Optional[Dict[str, Any]] = None):
+        # seq is AUTOINCREMENT, the database never hands out an earlier one
+        with self.database.transaction():
+            self.clear()
+            for todo in todos:
+                self.add(todo)
+
+    def count(self) -> int:
+        row = self.database.connection().execute(
+            "SELECT todo_count FROM sessions WHERE session_id = ?", (self.session_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def texts(self, todo_ids: Optional[List[TodoId]] = None) -> List[str]:
+        if todo_ids is not None:
+            connection = self.database.connection()
+            texts = []
+            for todo_id in todo_ids:
+                row = connection.execute(
+                    "SELECT text FROM todos WHERE session_id = ? AND id = ?", (self.session_id, todo_id)
+                ).fetchone()
+                if row is not None:
+                    texts.append(row[0])
+            return texts
+        rows = self.database.connection().execute(
+            "SELECT text FROM todos WHERE session_id = ? ORDER BY seq", (self.session_id,)
+        )
+        return [row[0] for row in rows]
+
+    def records(self) -> List[TodoRecord]:
+        rows = self.database.connection().execute(
+            "SELECT id, text, created_at, completed FROM todos WHERE session_id = ? ORDER BY seq",
+            (self.session_id,),
+        )
+        return [
+            TodoRecord(TodoRecord.parse_id(todo_id), text, int(created_at), bool(completed))
+            for todo_id, text, created_at, completed in rows
+        ]
+
+    def fingerprint(self) -> str:
+        row = self.database.connection().execute(
+            "SELECT todo_count, state_hash FROM sessions WHERE session_id = ?", (self.session_id,)
+        ).fetchone()
+        count, state_hash = row if row else (0, 0)
+        return f"{count}:{state_hash:016x}"
+
+    def version(self) -> str:
+        # A todo deleted and added again gets a higher seq, so it changes the last seq or the fingerprint
+        row = self.database.connection().execute(
+            "SELECT MAX(seq) FROM todos WHERE session_id = ?", (self.session_id,)
+        ).fetchone()
+        return f"{self.fingerprint()}:{row[0]}"
+
+    def page(self, after: Optional[int], limit: int) -> Tuple[List[TodoRecord], Optional[int]]:
+        # One row more than asked for says whether there is a next page
+        rows = self.database.connection().execute(
+            "SELECT seq, id, text, created_at, completed FROM todos WHERE session_id = ? AND seq > ? "
+            "ORDER BY seq LIMIT ?",
+            (self.session_id, -1 if after is None else after, limit + 1),
+        ).fetchall()
+        todos = [
+            TodoRecord(TodoRecord.parse_id(todo_id), text, int(created_at), bool(completed))
+            for _, todo_id, text, created_at, completed in rows[:limit]
+        ]
+        return todos, rows[limit - 1][0] if len(rows) > limit else None
+
+    def get_confirmation(self) -> Tuple[bool, Optional[str]]:
+        row = self.database.connection().execute(
+            "SELECT waiting_for_confirmation, pending_action FROM sessions WHERE session_id = ?",
+            (self.session_id,),
+        ).fetchone()
+        return (bool(row[0]), row[1]) if row else (False, None)
+
+    def set_confirmation(self, waiting: bool, pending_action: Optional[str]):
+        with self.database.transaction() as connection:
+            connection.execute(
+                "INSERT INTO sessions (session_id, waiting_for_confirmation, pending_action) VALUES (?, ?, ?) "
+                "ON CONFLICT (session_id) DO UPDATE SET waiting_for_confirmation = excluded.waiting_for_confirmation, "
+                "pending_action = excluded.pending_action",
+                (self.session_id, int(waiting), pending_action),
+            )
+
+
+_shared_database: Optional[SqliteDatabase] = None
+_shared_lock = threading.Lock()
+
+
+def shared_database() -> Optional[SqliteDatabase]:
+    """The database at TODO_DATABASE, opened once per process, None when unset"""
+    global _shared_database
+    path = os.getenv("TODO_DATABASE")
+    if not path:
+        return None
+    with _shared_lock:
+        if _shared_database is None:
+            _shared_database = SqliteDatabase(path)
+        return _shared_database
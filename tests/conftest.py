@@ -0,0 +1,77 @@
+import asyncio
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# The clients are never built, nothing here reaches OpenAI
+os.environ.setdefault("OPENAI_API_KEY", "test")
+# Agents built by the code under test would otherwise share decisions across tests
+os.environ.setdefault("TODO_DECISION_CACHE", "0")
+
+from decision_cache import DecisionCache
+from todo_agent import TodoAgent
+
+
+def _reply(text: str = None, tool_calls=()):
+    """A chat completion with the given text or (name, arguments) tool calls"""
+    calls = [
+        SimpleNamespace(function=SimpleNamespace(name=name, arguments=json.dumps(args)))
+        for name, args in tool_calls
+    ]
+    message = SimpleNamespace(content=text, tool_calls=calls or None)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+class ScriptedTransport:
+    """Answers each model call with the next scripted response, or raises it if it is an exception"""
+
+    def __init__(self, *responses, delay: float = 0):
+        self.responses = list(responses)
+        self.requests = []
+        # Async calls take this long, so later messages can queue behind them
+        self.delay = delay
+
+    @property
+    def calls(self) -> int:
+        return len(self.requests)
+
+    def create(self, **request):
+        self.requests.append(request)
+        response = self.responses.pop(0)
+        if isinstance(response, BaseException):
+            raise response
+        return response
+
+    async def acreate(self, **request):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self.create(**request)
+
+
+@pytest.fixture
+def reply():
+    return _reply
+
+
+@pytest.fixture
+def scripted_transport():
+    return ScriptedTransport
+
+
+@pytest.fixture
+def make_agent():
+    """
+    Factory for agents holding texts, with their own decision cache. The
+    transport defaults to one that fails on any model call.
+    """
+    def make(*texts, transport=None, decision_cache=None, fast_path=True) -> TodoAgent:
+        agent = TodoAgent(decision_cache=decision_cache or DecisionCache(), transport=transport or ScriptedTransport())
+        agent.fast_path_enabled = fast_path
+        for text in texts:
+            agent.add_todo(text)
+        return agent
+    return make
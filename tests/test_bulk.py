@@ -0,0 +1,22 @@
+import asyncio
+
+from bulk import ndjson_lines
+
+
+def _lines(*chunks, max_line=16):
+    async def body():
+        for chunk in chunks:
+            yield chunk
+
+    async def collect():
+        return [item async for item in ndjson_lines(body(), max_line=max_line)]
+    return asyncio.run(collect())
+
+
+def test_lines_split_across_chunks():
+    assert _lines(b'{"a"', b':1}\n\n{"b":2}') == [(1, b'{"a":1}'), (3, b'{"b":2}')]
+
+
+def test_long_lines_are_dropped_as_they_arrive():
+    assert _lines(b"x" * 20, b"x" * 20, b"\nok\n", b"y" * 40) == [(1, None), (2, b"ok"), (3, None)]
+    assert _lines(b"x" * 10, b"x" * 10 + b"\nok") == [(1, None), (2, b"ok")]
@@ -0,0 +1,52 @@
+from decision_cache import DecisionCache
+
+
+def test_follow_up_decision_is_not_reused_in_another_conversation(make_agent, scripted_transport, reply):
+    cache = DecisionCache()
+    first = scripted_transport(
+        reply("Should I add party balloons to your list?"),
+        reply(tool_calls=[("add_todo", {"text": "buy party balloons"})]),
+    )
+    agent_a = make_agent(transport=first, decision_cache=cache, fast_path=False)
+    agent_a.process_message("I'm throwing a party on Saturday")
+    agent_a.process_message("yes")
+    assert agent_a.storage.texts() == ["Buy party balloons"]
+
+    second = scripted_transport(
+        reply("Would you like a reminder to water the plants?"),
+        reply("Okay, I won't add anything."),
+    )
+    agent_b = make_agent(transport=second, decision_cache=cache, fast_path=False)
+    agent_b.process_message("I'm going away for a week")
+    assert agent_b.process_message("yes") == "Okay, I won't add anything."
+    assert second.calls == 2
+    assert agent_b.storage.texts() == []
+
+
+def test_standalone_message_is_shared_between_fresh_sessions(make_agent, scripted_transport, reply):
+    cache = DecisionCache()
+    first = scripted_transport(reply(tool_calls=[("add_todo", {"text": "buy milk"})]))
+    make_agent(transport=first, decision_cache=cache, fast_path=False).process_message("I'm out of milk")
+
+    second = scripted_transport()
+    agent = make_agent(transport=second, decision_cache=cache, fast_path=False)
+    agent.process_message("I'm out of milk")
+    assert second.calls == 0
+    assert agent.storage.texts() == ["Buy milk"]
+
+
+def test_later_turns_still_share_decisions(make_agent, scripted_transport, reply):
+    cache = DecisionCache()
+    first = scripted_transport(reply("Hi! What do you need to do?"), reply("Sure."),
+                               reply(tool_calls=[("add_todo", {"text": "buy milk"})]))
+    agent = make_agent(transport=first, decision_cache=cache, fast_path=False)
+    agent.process_message("hey there, todo bot")
+    agent.process_message("I'll tell you in a second")
+    agent.process_message("I'm out of milk")
+
+    second = scripted_transport(reply("Noted, it's been a long week."))
+    other = make_agent(transport=second, decision_cache=cache, fast_path=False)
+    other.process_message("what a week")
+    other.process_message("I'm out of milk")
+    assert second.calls == 1
+    assert other.storage.texts() == ["Buy milk"]
@@ -0,0 +1,29 @@
+def test_loose_fuzzy_match_waits_for_yes(make_agent):
+    agent = make_agent("Buy silk", "Pay rent")
+    reply = agent.delete_todo("milk")
+    assert "Did you mean 'Buy silk'?" in reply
+    assert agent.storage.texts() == ["Buy silk", "Pay rent"]
+    assert agent.process_message("yes") == "Task 'Buy silk' deleted."
+    assert agent.storage.texts() == ["Pay rent"]
+
+
+def test_declined_fuzzy_match_deletes_nothing(make_agent):
+    agent = make_agent("Water plants")
+    agent.delete_todo("walter")
+    assert agent.process_message("no") == "Okay, nothing was deleted."
+    assert agent.storage.texts() == ["Water plants"]
+    assert not agent.waiting_for_confirmation
+
+
+def test_near_exact_fuzzy_match_deletes_directly(make_agent):
+    agent = make_agent("Schedule dentist appointment", "Buy milk")
+    assert agent.delete_todo("shedule dentist appointment") == "Task 'Schedule dentist appointment' deleted."
+    assert not agent.waiting_for_confirmation
+
+
+def test_category_delete_waits_for_yes(make_agent):
+    agent = make_agent("Call dentist", "Email grandma", "Run errands", "Buy milk")
+    reply = agent.process_message("remove family stuff")
+    assert reply == "This would delete 1 task: 'Email grandma'. Type 'yes' to confirm."
+    assert agent.process_message("yes") == "Task 'Email grandma' deleted."
+    assert agent.storage.texts() == ["Call dentist", "Run errands", "Buy milk"]
@@ -0,0 +1,78 @@
+import os
+
+from journal import Journal, JournalSessionStore
+from models import TodoRecord
+
+
+def _store(directory, **options) -> JournalSessionStore:
+    return JournalSessionStore(str(directory), commit_interval=0, fsync=False, **options)
+
+
+def _texts(store, session_id):
+    state = store.load(session_id)
+    return [todo["text"] for todo in state["todos"]] if state else []
+
+
+def test_recovery_merges_snapshot_and_replay(tmp_path):
+    store = _store(tmp_path)
+    milk, rent = TodoRecord.new("Buy milk"), TodoRecord.new("Pay rent")
+    store.journal_for("a").added(milk)
+    store.journal_for("a").added(rent)
+    store.journal_for("b").added(TodoRecord.new("Call mom"))
+    store.snapshot()
+    # After the snapshot: changes to a snapshotted session, a new session and a dropped one
+    store.journal_for("a").deleted(milk.id)
+    store.save("a", {"todos": [], "history": ["hi"]})
+    store.journal_for("c").added(TodoRecord.new("Book flight"))
+    store.delete("b")
+    store.close()
+
+    store = _store(tmp_path)
+    assert store.recovered == {"snapshot_todos": 3, "replayed": 4}
+    assert _texts(store, "a") == ["Pay rent"]
+    assert store.load("a")["history"] == ["hi"]
+    assert store.load("b") is None
+    assert _texts(store, "c") == ["Book flight"]
+
+    # A second snapshot merges the first with the replayed records and drops the old segments
+    store.snapshot()
+    assert store.todo_count() == 2
+    store.close()
+    store = _store(tmp_path)
+    assert store.recovered == {"snapshot_todos": 2, "replayed": 0}
+    assert _texts(store, "a") == ["Pay rent"]
+    store.close()
+
+
+def test_background_snapshot_is_recovered(tmp_path):
+    store = _store(tmp_path, snapshot_every=10)
+    journal = store.journal_for("a")
+    for index in range(25):
+        journal.added(TodoRecord.new(f"Task {index}"))
+    store.close()
+
+    store = _store(tmp_path)
+    # How much of the rest was snapshotted depends on when the background thread ran
+    assert store.recovered["snapshot_todos"] >= 10
+    assert store.recovered["snapshot_todos"] + store.recovered["replayed"] == 25
+    assert store.todo_count() == 25
+    store.close()
+
+
+def test_torn_last_line_is_skipped(tmp_path):
+    store = _store(tmp_path)
+    store.journal_for("a").added(TodoRecord.new("Buy milk"))
+    store.close()
+    last = Journal.segments(str(tmp_path))[-1]
+    # A crash in the middle of a write
+    with open(os.path.join(str(tmp_path), f"journal-{last:08d}.log"), "a", encoding="utf-8") as f:
+        f.write('["a","a","id","Pay re')
+
+    store = _store(tmp_path)
+    assert _texts(store, "a") == ["Buy milk"]
+    # Later records go to a new segment, not after the torn line
+    store.journal_for("a").added(TodoRecord.new("Call mom"))
+    store.close()
+    store = _store(tmp_path)
+    assert _texts(store, "a") == ["Buy milk", "Call mom"]
+    store.close()
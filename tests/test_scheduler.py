@@ -0,0 +1,63 @@
+import asyncio
+
+from scheduler import COALESCED_REPLY, MessageScheduler
+from sessions import InMemorySessionStore, SessionManager
+from transport import CircuitOpenError
+
+
+def _scheduler(transport, **options) -> MessageScheduler:
+    sessions = SessionManager(store=InMemorySessionStore())
+    sessions.transport = transport
+    return MessageScheduler(sessions, **options)
+
+
+async def _burst(scheduler, *messages):
+    """Send messages to one session at once, as a client firing a burst would"""
+    replies = await asyncio.gather(*(scheduler.submit("user", message) for message in messages))
+    async with scheduler.sessions.session("user") as agent:
+        return replies, agent.storage.texts()
+
+
+def test_messages_are_answered_in_order(scripted_transport, reply):
+    transport = scripted_transport(reply("Which list?"), delay=0.01)
+    scheduler = _scheduler(transport, coalesce=False)
+    replies, texts = asyncio.run(_burst(scheduler, "show my list", "add buy milk", "organize things", "remove milk"))
+    assert replies[2] == "Which list?"
+    assert transport.calls == 1
+    # The delete only finds milk because the add before it already ran
+    assert texts == []
+
+
+def test_burst_is_coalesced_into_one_call(scripted_transport, reply):
+    transport = scripted_transport(reply("Added milk, eggs and bread"), delay=0.01)
+    scheduler = _scheduler(transport, coalesce=True)
+    replies, _ = asyncio.run(_burst(scheduler, "milk", "eggs", "bread"))
+    assert transport.calls == 1
+    assert replies == [COALESCED_REPLY, COALESCED_REPLY, "Added milk, eggs and bread"]
+    assert transport.requests[0]["messages"][-1]["content"] == "milk\neggs\nbread"
+
+
+def test_coalescing_can_be_turned_off(scripted_transport, reply):
+    transport = scripted_transport(reply("one"), reply("two"), reply("three"), delay=0.01)
+    scheduler = _scheduler(transport, coalesce=False, coalesce_window=1)
+    replies, _ = asyncio.run(_burst(scheduler, "milk", "eggs", "bread"))
+    assert transport.calls == 3
+    assert replies == ["one", "two", "three"]
+
+
+def test_shed_messages_are_answered_one_by_one(scripted_transport):
+    transport = scripted_transport()
+    scheduler = _scheduler(transport, coalesce=True, max_concurrency=0, queue_limit=0)
+    replies, texts = asyncio.run(_burst(scheduler, "add milk", "add eggs", "add bread"))
+    assert transport.calls == 0
+    assert COALESCED_REPLY not in replies
+    assert texts == ["Milk", "Eggs", "Bread"]
+
+
+def test_breaker_open_burst_adds_each_item(scripted_transport):
+    transport = scripted_transport(CircuitOpenError("open"))
+    scheduler = _scheduler(transport, coalesce=True)
+    _, texts = asyncio.run(_burst(scheduler, "add milk", "add eggs", "add bread"))
+    # One coalesced call fails, the fallback still reads three separate adds
+    assert transport.calls == 1
+    assert texts == ["Milk", "Eggs", "Bread"]
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from sessions import InMemorySessionStore, JsonFileSessionStore, SessionManager, SessionStoreFull
+
+
+def test_full_store_refuses_sessions():
+    store = InMemorySessionStore(max_entries=3, max_bytes=1 << 20)
+    for index in range(3):
+        store.save(f"user-{index}", {"todos": [index]})
+    with pytest.raises(SessionStoreFull):
+        store.save("user-3", {"todos": [3]})
+    # Replacing a stored session doesn't need room
+    store.save("user-0", {"todos": ["again"]})
+    assert store.load("user-0") == {"todos": ["again"]}
+    assert store.load("user-2") == {"todos": [2]}
+
+
+def test_loaded_sessions_leave_the_store():
+    store = InMemorySessionStore()
+    store.save("user", {"todos": []})
+    assert store.load("user") == {"todos": []}
+    assert len(store) == 0
+    assert store.load("user") is None
+
+
+async def _add(sessions, session_id, text):
+    async with sessions.session(session_id) as agent:
+        agent.add_todo(text)
+
+
+async def _texts(sessions, session_id):
+    async with sessions.session(session_id) as agent:
+        return agent.storage.texts()
+
+
+def test_evicted_sessions_are_restored(tmp_path):
+    sessions = SessionManager(store=JsonFileSessionStore(str(tmp_path)), max_sessions=1, shards=1)
+
+    async def run():
+        await _add(sessions, "a", "Buy milk")
+        await _add(sessions, "b", "Pay rent")
+        return await _texts(sessions, "a")
+
+    assert asyncio.run(run()) == ["Buy milk"]
+    assert sessions.stats()["restored"] == 1
+
+
+def test_sessions_stay_resident_when_the_store_is_full():
+    sessions = SessionManager(store=InMemorySessionStore(max_entries=1), max_sessions=1, shards=1)
+
+    async def run():
+        todos = {"a": "Buy milk", "b": "Pay rent", "c": "Call mom"}
+        for session_id, text in todos.items():
+            await _add(sessions, session_id, text)
+        return [await _texts(sessions, session_id) for session_id in todos]
+
+    assert asyncio.run(run()) == [["Buy milk"], ["Pay rent"], ["Call mom"]]
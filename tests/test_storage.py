@@ -0,0 +1,59 @@
+from models import TodoRecord
+from storage import SqliteDatabase, SqliteTodoStorage
+
+
+def _add(storage, *texts):
+    for text in texts:
+        storage.add(TodoRecord.new(text))
+
+
+def _matched(storage, query):
+    _, ids = storage.match(query)
+    return storage.texts(ids)
+
+
+def test_sqlite_match_sees_changes_from_other_workers(tmp_path):
+    database = SqliteDatabase(str(tmp_path / "todos.db"))
+    storage = SqliteTodoStorage(database, "user")
+    # Another worker's view of the same session
+    other = SqliteTodoStorage(database, "user")
+    _add(storage, "Buy milk", "Pay rent", "Call mom")
+    assert _matched(storage, "mlk") == ["Buy milk"]
+
+    _add(other, "Buy silk")
+    assert _matched(storage, "silk") == ["Buy silk"]
+
+    # The last row is removed and its text added again under a new id
+    other.remove(other.search("buy silk"))
+    _add(other, "Buy silk")
+    assert storage.remove(storage.match("silk")[1]) == ["Buy silk"]
+
+    other.remove(other.search("buy milk"))
+    assert _matched(storage, "mlk") == []
+    assert storage.texts() == ["Pay rent", "Call mom"]
+
+
+def test_cursor_survives_clear_all(make_agent):
+    agent = make_agent("Buy milk", "Pay rent", "Call mom")
+    _, cursor = agent.get_todos_page(limit=2)
+    agent.storage.clear()
+    for text in ("Book flight", "Water plants", "Send invoice"):
+        agent.add_todo(text)
+    todos, _ = agent.get_todos_page(cursor)
+    # Everything added after the cursor was handed out, nothing skipped
+    assert [todo.text for todo in todos] == ["Book flight", "Water plants", "Send invoice"]
+
+
+def test_cursor_survives_spill_and_restore(make_agent):
+    agent = make_agent("Buy milk", "Pay rent", "Call mom", "Book flight", "Water plants")
+    agent.delete_todo("buy milk")
+    agent.delete_todo("pay rent")
+    todos, cursor = agent.get_todos_page(limit=2)
+    assert [todo.text for todo in todos] == ["Call mom", "Book flight"]
+
+    restored = make_agent()
+    restored.load_state(agent.export_state())
+    todos, _ = restored.get_todos_page(cursor)
+    assert [todo.text for todo in todos] == ["Water plants"]
+    restored.add_todo("Send invoice")
+    assert [todo.text for todo in restored.get_todos_page(cursor)[0]] == ["Water plants", "Send invoice"]
@@ -0,0 +1,44 @@
+import asyncio
+from types import SimpleNamespace
+
+from transport import Transport
+
+
+class _SlowCompletions:
+    """Async completions that never answer, recording how each call ends"""
+
+    def __init__(self):
+        self.started = 0
+        self.cancelled = 0
+
+    async def create(self, **request):
+        self.started += 1
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+
+def _hedging_transport(completions) -> Transport:
+    transport = Transport(async_client=SimpleNamespace(chat=SimpleNamespace(completions=completions)), hedge=True)
+    for _ in range(transport.latency.min_samples):
+        transport.latency.add(0.05)
+    return transport
+
+
+def test_cancelled_call_cancels_its_attempts():
+    completions = _SlowCompletions()
+    transport = _hedging_transport(completions)
+
+    async def cancel_after(wait: float):
+        call = asyncio.ensure_future(transport.acreate(model="m", messages=[]))
+        await asyncio.sleep(wait)
+        call.cancel()
+        await asyncio.gather(call, return_exceptions=True)
+        await asyncio.sleep(0)
+        return completions.started, completions.cancelled
+
+    # Before the hedge is due, then after it was sent
+    assert asyncio.run(cancel_after(0.01)) == (1, 1)
+    assert asyncio.run(cancel_after(0.1)) == (3, 3)
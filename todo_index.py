@@ -0,0 +1,155 @@
+import hashlib
+import sys
+from typing import Dict, Iterable, List, Optional, Set
+
+_HASH_MASK = (1 << 64) - 1
+
+# Below this many todos a linear scan is as fast as the trigram postings,
+# so small lists (most sessions) don't pay for them
+POSTINGS_THRESHOLD = 64
+
+
+def _text_hash(text: str) -> int:
+    # Stable across processes, unlike hash(), so fingerprints can be shared
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TodoIndex:
+    """
+    Incrementally maintained lookups over a todo dict.
+
+    Keeps a lowercased text -> id map for O(1) duplicate checks and a
+    trigram inverted index for case-insensitive substring search, built once
+    the list outgrows POSTINGS_THRESHOLD. Results match a linear scan over
+    the todos in insertion order.
+    """
+
+    def __init__(self):
+        # Lowercased text -> todo id
+        self._by_text: Dict[str, str] = {}
+        # Todo id -> lowercased text, in insertion order
+        self._texts: Dict[str, str] = {}
+        # Todo id -> insertion sequence, used to order search results
+        self._order: Dict[str, int] = {}
+        # Trigram -> ids of todos containing it, None while the list is small
+        self._postings: Optional[Dict[str, Set[str]]] = None
+        # Next insertion sequence, never goes back so page cursors stay valid across clears and restores
+        self._seq = 0
+        # Order-independent sum of text hashes, see fingerprint
+        self._state_hash = 0
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def add(self, todo_id: str, text: str, order: Optional[int] = None):
+        """Index a todo, call after it has been stored. order restores its sequence, if still ahead"""
+        # Interned, common todos like "buy milk" are shared between sessions
+        text_lower = sys.intern(text.lower())
+        self._by_text.setdefault(text_lower, todo_id)
+        self._texts[todo_id] = text_lower
+        if order is None or order < self._seq:
+            order = self._seq
+        self._order[todo_id] = order
+        self._seq = order + 1
+        self._state_hash = (self._state_hash + _text_hash(text_lower)) & _HASH_MASK
+        if self._postings is not None:
+            self._post(todo_id, text_lower)
+        elif len(self._texts) > POSTINGS_THRESHOLD:
+            self._postings = {}
+            for indexed_id, indexed_text in self._texts.items():
+                self._post(indexed_id, indexed_text)
+
+    def _post(self, todo_id: str, text_lower: str):
+        for gram in _trigrams(text_lower):
+            postings = self._postings.get(gram)
+            if postings is None:
+                self._postings[gram] = {todo_id}
+            else:
+                postings.add(todo_id)
+
+    def remove(self, todo_id: str):
+        """Drop a todo from the index"""
+        text_lower = self._texts.pop(todo_id, None)
+        if text_lower is None:
+            return
+        del self._order[todo_id]
+        self._state_hash = (self._state_hash - _text_hash(text_lower)) & _HASH_MASK
+        if self._by_text.get(text_lower) == todo_id:
+            del self._by_text[text_lower]
+        if self._postings is None:
+            return
+        for gram in _trigrams(text_lower):
+            postings = self._postings.get(gram)
+            if postings is not None:
+                postings.discard(todo_id)
+                if not postings:
+                    del self._postings[gram]
+
+    def clear(self):
+        self._by_text.clear()
+        self._texts.clear()
+        self._order.clear()
+        self._postings = None
+        self._state_hash = 0
+
+    def rebuild(self, todos: Iterable, orders: Optional[Dict[str, int]] = None, next_seq: int = 0):
+        """
+        Index todos from scratch, e.g. after restoring a session. orders and
+        next_seq (see next_seq) restore the sequences a spilled session had.
+        """
+        self.clear()
+        for todo in todos:
+            order = orders.get(todo.id) if orders else None
+            if order is None:
+                # Added after the orders were saved
+                self._seq = max(self._seq, next_seq)
+            self.add(todo.id, todo.text, order)
+        self._seq = max(self._seq, next_seq)
+
+    def order_of(self, todo_id: str) -> int:
+        """Insertion sequence of a todo, increases with every add"""
+        return self._order[todo_id]
+
+    @property
+    def next_seq(self) -> int:
+        return self._seq
+
+    @property
+    def fingerprint(self) -> str:
+        """Identifies the set of todo texts ignoring case, kept up to date in O(1) per change"""
+        return f"{len(self._texts)}:{self._state_hash:016x}"
+
+    def find_duplicate(self, text: str) -> Optional[str]:
+        """Return the id of a todo with the same text ignoring case"""
+        return self._by_text.get(text.lower())
+
+    def search(self, query: str) -> List[str]:
+        """Ids of todos whose text contains query ignoring case, in insertion order"""
+        query_lower = query.lower()
+
+        # Queries shorter than a trigram can't use the postings
+        if self._postings is None or len(query_lower) < 3:
+            return [todo_id for todo_id, text in self._texts.items() if query_lower in text]
+
+        # Intersect postings starting from the rarest trigram
+        postings = []
+        for gram in _trigrams(query_lower):
+            ids = self._postings.get(gram)
+            if not ids:
+                return []
+            postings.append(ids)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for ids in postings[1:]:
+            candidates &= ids
+            if not candidates:
+                return []
+
+        # Trigrams can all be present without forming the substring
+        matches = [todo_id for todo_id in candidates if query_lower in self._texts[todo_id]]
+        matches.sort(key=self._order.__getitem__)
+        return matches
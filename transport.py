@@ -0,0 +1,333 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Optional, Tuple
+
+from metrics import REGISTRY
+
+# openai takes about a second to import, it is only loaded once a message needs the model
+if TYPE_CHECKING:
+    import httpx
+    import openai
+
+
+@lru_cache(maxsize=None)
+def upstream_errors() -> Tuple[type, ...]:
+    """Errors that say the upstream is unhealthy, as opposed to a bad request"""
+    import openai
+    return (
+        openai.APIConnectionError,  # includes APITimeoutError
+        openai.InternalServerError,
+        openai.RateLimitError,
+        asyncio.TimeoutError,
+    )
+
+HEDGES = REGISTRY.counter(
+    "todo_llm_hedges_total",
+    "Hedged LLM requests by outcome (sent, won)",
+    ["outcome"],
+)
+FALLBACKS = REGISTRY.counter(
+    "todo_llm_fallbacks_total",
+    "Messages handled by the local fallback because the LLM was unavailable",
+    ["reason"],
+)
+BREAKER_EVENTS = REGISTRY.counter(
+    "todo_llm_breaker_events_total",
+    "Circuit breaker transitions and calls rejected while open",
+    ["event"],
+)
+
+
+class CircuitOpenError(Exception):
+    """The circuit breaker is open, the upstream isn't being called"""
+
+
+class CircuitBreaker:
+    """
+    Stops calling an upstream that keeps failing.
+
+    Opens after failure_threshold consecutive failures. While open every call
+    is rejected; after reset_timeout seconds a single trial call is let through
+    (half-open) and its outcome closes or re-opens the breaker.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+
+    def allow(self) -> bool:
+        """Whether a call may go out now, callers report its outcome afterwards"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                BREAKER_EVENTS.inc(event="half_open")
+            if self.state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+        BREAKER_EVENTS.inc(event="rejected")
+        return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                BREAKER_EVENTS.inc(event="closed")
+            self.state = self.CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self._failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                BREAKER_EVENTS.inc(event="opened")
+            self._trial_running = False
+
+    def release(self):
+        """The call ended without saying anything about upstream health"""
+        with self._lock:
+            self._trial_running = False
+
+
+class LatencyWindow:
+    """Latencies of the most recent successful calls, for the hedging threshold"""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """None until there are enough samples to trust"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def _limits() -> "httpx.Limits":
+    import httpx
+    return httpx.Limits(
+        max_connections=int(os.getenv("TODO_LLM_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("TODO_LLM_KEEPALIVE_CONNECTIONS", "20")),
+        keepalive_expiry=30.0,
+    )
+
+
+def _timeout(deadline: float) -> "httpx.Timeout":
+    import httpx
+    # Connecting should be quick, the rest of the deadline is for the model
+    return httpx.Timeout(deadline, connect=min(3.0, deadline))
+
+
+class Transport:
+    """
+    The OpenAI clients every session shares, with a sized keep-alive
+    connection pool, a deadline per request, optional hedging and a circuit
+    breaker.
+
+    Hedging: once an async call has taken longer than the recent p95
+    (hedge_percentile), a second identical request is sent and whichever answers first is used.
+    Chat completions have no side effects, tools run locally, so the loser is
+    simply cancelled. Only the async path hedges, the sync client is left for
+    scripts and benchmarks.
+
+    When the breaker is open, calls raise CircuitOpenError straight away so
+    TodoAgent can fall back to its local handler instead of queuing behind a
+    failing upstream.
+
+    The clients are built on first use or by warm_up(), so a process whose
+    messages all take the fast path never imports openai or opens a
+    connection pool.
+    """
+
+    def __init__(self, client: "openai.OpenAI" = None, async_client: "openai.AsyncOpenAI" = None,
+                 deadline: float = None, max_retries: int = None, hedge: bool = None,
+                 hedge_percentile: float = None, breaker: CircuitBreaker = None):
+        if deadline is None:
+            deadline = float(os.getenv("TODO_LLM_DEADLINE", "20"))
+        if max_retries is None:
+            max_retries = int(os.getenv("TODO_LLM_MAX_RETRIES", "1"))
+        if hedge is None:
+            hedge = os.getenv("TODO_LLM_HEDGE", "0") == "1"
+        if hedge_percentile is None:
+            hedge_percentile = float(os.getenv("TODO_LLM_HEDGE_PERCENTILE", "95"))
+        if breaker is None:
+            breaker = CircuitBreaker(
+                failure_threshold=int(os.getenv("TODO_LLM_BREAKER_FAILURES", "5")),
+                reset_timeout=float(os.getenv("TODO_LLM_BREAKER_RESET", "30")),
+            )
+
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.breaker = breaker
+        self.latency = LatencyWindow()
+        # Clients passed in keep their own settings, e.g. the benchmark stubs
+        self._client = client
+        self._async_client = async_client
+        self._clients_lock = threading.Lock()
+
+    @property
+    def client(self) -> "openai.OpenAI":
+        if self._client is None:
+            with self._clients_lock:
+                if self._client is None:
+                    import openai
+                    self._client = openai.OpenAI(
+                        api_key=os.getenv("OPENAI_API_KEY"),
+                        max_retries=self.max_retries,
+                        timeout=_timeout(self.deadline),
+                        http_client=openai.DefaultHttpxClient(limits=_limits(), timeout=_timeout(self.deadline)),
+                    )
+        return self._client
+
+    @client.setter
+    def client(self, client: "openai.OpenAI"):
+        self._client = client
+
+    @property
+    def async_client(self) -> "openai.AsyncOpenAI":
+        if self._async_client is None:
+            with self._clients_lock:
+                if self._async_client is None:
+                    import openai
+                    self._async_client = openai.AsyncOpenAI(
+                        api_key=os.getenv("OPENAI_API_KEY"),
+                        max_retries=self.max_retries,
+                        timeout=_timeout(self.deadline),
+                        http_client=openai.DefaultAsyncHttpxClient(limits=_limits(), timeout=_timeout(self.deadline)),
+                    )
+        return self._async_client
+
+    @async_client.setter
+    def async_client(self, async_client: "openai.AsyncOpenAI"):
+        self._async_client = async_client
+
+    def warm_up(self) -> threading.Thread:
+        """
+        Build the clients in a background thread, for a server that just
+        started. openai imports its API resources on the first request, so
+        this also touches chat.completions.
+        """
+        def build():
+            self.client.chat.completions
+            self.async_client.chat.completions
+
+        thread = threading.Thread(target=build, name="llm-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def _record(self, error: Optional[BaseException], started: float):
+        if error is None:
+            self.latency.add(time.perf_counter() - started)
+            self.breaker.record_success()
+        elif isinstance(error, upstream_errors()):
+            self.breaker.record_failure()
+        else:
+            # A 4xx or a cancelled request says nothing about upstream health
+            self.breaker.release()
+
+    def create(self, **request) -> Any:
+        """chat.completions.create on the sync client"""
+        if not self.breaker.allow():
+            raise CircuitOpenError("LLM circuit breaker is open")
+        started = time.perf_counter()
+        try:
+            response = self.client.chat.completions.create(**request)
+        except BaseException as e:
+            self._record(e, started)
+            raise
+        self._record(None, started)
+        return response
+
+    async def acreate(self, **request) -> Any:
+        """chat.completions.create on the async client, hedged and bounded by the deadline"""
+        if not self.breaker.allow():
+            raise CircuitOpenError("LLM circuit breaker is open")
+        started = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(self._hedged(request), self.deadline)
+        except BaseException as e:
+            self._record(e, started)
+            raise
+        self._record(None, started)
+        return response
+
+    async def _hedged(self, request: dict) -> Any:
+        hedge_after = self.latency.percentile(self.hedge_percentile) if self.hedge else None
+        if hedge_after is None:
+            return await self.async_client.chat.completions.create(**request)
+
+        first = asyncio.ensure_future(self.async_client.chat.completions.create(**request))
+        attempts = [first]
+        winner = None
+        try:
+            done, _ = await asyncio.wait({first}, timeout=hedge_after)
+            if not done:
+                HEDGES.inc(outcome="sent")
+                attempts.append(asyncio.ensure_future(self.async_client.chat.completions.create(**request)))
+            pending = set(attempts)
+            error = None
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = winner or task
+                    else:
+                        error = task.exception()
+            if winner is None:
+                # Every attempt failed
+                raise error
+            if winner is not first:
+                HEDGES.inc(outcome="won")
+            return winner.result()
+        finally:
+            # Also reached when the caller is cancelled or times out, nothing may outlive the call
+            for task in attempts:
+                if not task.done():
+                    task.cancel()
+                elif request.get("stream") and task is not winner and not task.cancelled() \
+                        and task.exception() is None:
+                    # A stream that completed alongside the winner still holds a connection
+                    await task.result().close()
+
+
+_shared_transport: Optional[Transport] = None
+_shared_lock = threading.Lock()
+
+
+REGISTRY.gauge(
+    "todo_llm_breaker_open",
+    "1 while the LLM circuit breaker is open or half-open",
+    lambda: int(_shared_transport is not None and _shared_transport.breaker.state != CircuitBreaker.CLOSED),
+)
+
+
+def shared_transport() -> Transport:
+    """One transport per process, so all sessions share its pool and breaker"""
+    global _shared_transport
+    with _shared_lock:
+        if _shared_transport is None:
+            _shared_transport = Transport()
+        return _shared_transport